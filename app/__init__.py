@@ -1,10 +1,14 @@
 from flask import Flask
 from flask_cors import CORS
-import os
-from google import genai
-import logging
 
-def create_app():
+def create_app(background=True):
+    """Build the app; `background` starts the startup jobs in this process.
+
+    A preforking server passes background=False, builds the app once in the
+    master, and starts the jobs in one worker after the fork instead (see
+    gunicorn.conf.py). Background threads must not be running when the
+    master forks.
+    """
     app = Flask(__name__)
     CORS(app, supports_credentials=True)
 
@@ -12,16 +16,67 @@ def create_app():
     from .config import FLASK_SECRET_KEY
     app.secret_key = FLASK_SECRET_KEY
 
+    # Keep session data server-side; the cookie only holds the session id
+    from .session_store import create_session_interface
+    app.session_interface = create_session_interface()
+
     # Initialize DB
     from .models import init_db
     init_db()
 
+    if background:
+        start_background_jobs()
+
     # Register routes
     from .routes import register_routes
     register_routes(app)
 
+    # Per-request trace ids and access events
+    from .logger import init_app as init_logging
+    init_logging(app)
+
+    # Route latency histograms and optional Server-Timing headers
+    from .metrics import init_app as init_metrics
+    init_metrics(app)
+
     # Session config
     from datetime import timedelta
     app.permanent_session_lifetime = timedelta(hours=2)
 
     return app
+
+
+def start_background_jobs():
+    # Index prompts stored before near-duplicate detection, off the request path
+    from .config import DEDUP_ENABLED
+    if DEDUP_ENABLED:
+        from .dedup import schedule_backfill
+        schedule_backfill()
+
+    # Top up low question buckets in the background
+    from .replenish import check_and_refill
+    check_and_refill()
+
+
+def warm_up():
+    """Fill the in-memory caches that the first requests would otherwise fill.
+
+    Run before a server accepts traffic. In a preloading master, the loaded
+    caches are shared copy-on-write with every worker.
+    """
+    from . import catalog, question_index
+    from .config import DEDUP_ENABLED, PDF_PATH, RETRIEVAL_TOP_K
+    from .logger import logger
+    catalog.refresh()
+    question_index.refresh()
+    if DEDUP_ENABLED:
+        from . import dedup
+        dedup.refresh()
+    try:
+        from .pdf_cache import load_document
+        load_document(PDF_PATH)
+        if RETRIEVAL_TOP_K > 0:
+            from .retrieval import load_index
+            load_index(PDF_PATH)
+    except Exception as e:
+        logger.warning("could not warm the chapter cache for %s: %s", PDF_PATH, e)
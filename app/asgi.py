@@ -0,0 +1,177 @@
+"""Async serving mode: the Flask app behind an asyncio ASGI adapter.
+
+Views still run on a small thread pool, but none of them holds a thread
+while it waits for the LLM. A view that would block on an LLM-bound future
+(see `wait`) raises Suspend instead. The adapter frees the thread, awaits
+the future on the event loop, and replays the request once it resolves.
+Upstream LLM calls go through the async client on the same loop, so one
+process carries many in-flight calls while fast routes keep being served.
+
+    uvicorn --factory app.asgi:create_asgi_app
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import has_request_context, request
+from .config import ASGI_THREADS
+from .logger import logger
+
+ASYNC_KEY = "quiz.async"
+EXPIRED_KEY = "quiz.wait_expired"
+
+
+class Suspend(BaseException):
+    """Raised out of a view to hand a blocking wait to the event loop.
+
+    A BaseException so that the views' `except Exception` handlers let it
+    through; Flask then unwinds without saving the session, which makes
+    replaying the request safe.
+    """
+
+    def __init__(self, future, timeout, owned):
+        super().__init__()
+        self.future = future
+        self.timeout = timeout
+        self.owned = owned      # nobody else waits on it: cancel it on timeout
+
+
+def wait(future, timeout, owned=False):
+    """`future.result(timeout)`, except that under the async server the wait is suspended.
+
+    Pass `owned` for futures created for this caller alone, so they are
+    cancelled rather than left behind when the wait times out.
+    """
+    if future.done() or not has_request_context() or not request.environ.get(ASYNC_KEY):
+        return future.result(timeout=timeout)
+    if request.environ.get(EXPIRED_KEY):
+        if owned:
+            future.cancel()
+        raise FutureTimeout()
+    raise Suspend(future, timeout, owned)
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ[name] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+class ASGIAdapter:
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+        self._loop = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            self._bind_loop()
+            await self._http(scope, receive, send)
+
+    def _bind_loop(self):
+        if self._loop is None:
+            from .llm_gateway import use_event_loop
+            self._loop = asyncio.get_running_loop()
+            use_event_loop(self._loop)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._bind_loop()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                from .llm_gateway import use_event_loop
+                use_event_loop(None)
+                self._pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        deadline = None
+        expired = False
+        while True:
+            environ = _environ(scope, body)
+            environ[ASYNC_KEY] = True
+            environ[EXPIRED_KEY] = expired
+            try:
+                status, headers, payload = await self._loop.run_in_executor(self._pool, self._run, environ)
+                break
+            except Suspend as s:
+                # The thread is free again; wait here, then replay the request
+                if deadline is None:
+                    deadline = self._loop.time() + s.timeout
+                waiting = asyncio.wrap_future(s.future)
+                try:
+                    await asyncio.wait_for(waiting if s.owned else asyncio.shield(waiting),
+                                           max(0.0, deadline - self._loop.time()))
+                except asyncio.TimeoutError:
+                    expired = True
+                except Exception as e:
+                    # The replay runs into the same failure and reports it
+                    logger.warning("suspended wait failed: %s", e)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+
+    def _run(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return lambda data: None
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            payload = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started["status"], started["headers"], payload
+
+
+def create_asgi_app(flask_app=None, threads=ASGI_THREADS):
+    """An ASGI application serving `flask_app` (default: a new one from create_app)."""
+    if flask_app is None:
+        from . import create_app
+        flask_app = create_app()
+    return ASGIAdapter(flask_app, threads)
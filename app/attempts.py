@@ -0,0 +1,103 @@
+"""Write-behind log of answer attempts.
+
+/answer only puts the attempt on an in-memory queue. A single writer
+thread drains it, committing a batch once ATTEMPTS_BATCH_SIZE attempts are
+waiting or the oldest has waited ATTEMPTS_FLUSH_INTERVAL_S, so request
+threads never wait on the database or its fsync.
+"""
+import atexit
+import queue
+import threading
+import time
+from .config import ATTEMPTS_BATCH_SIZE, ATTEMPTS_FLUSH_INTERVAL_S
+from .db import record_attempts
+from .logger import logger
+from .metrics import Counter, Gauge, Histogram
+
+# Failed batches are retried this many times before being dropped
+MAX_RETRIES = 3
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_writer = None
+
+WRITTEN = Counter("quiz_attempts_written_total", "Attempts committed to the attempts table")
+DROPPED = Counter("quiz_attempts_dropped_total", "Attempts dropped after repeated write failures")
+BATCH_SIZE = Histogram("quiz_attempt_batch_size", "Attempts per group commit", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+QUEUE_DEPTH = Gauge("quiz_attempts_queued", "Attempts waiting to be written", collect=lambda: {(): _queue.qsize()})
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run, name="attempts-writer", daemon=True)
+            _writer.start()
+
+
+def record_attempt(user_id, question_id, quiz_id, category, difficulty_level, correct):
+    """Queue one answer outcome; returns immediately."""
+    _ensure_writer()
+    _queue.put({
+        "user_id": user_id,
+        "question_id": question_id,
+        "quiz_id": quiz_id,
+        "category": category,
+        "difficulty_level": difficulty_level,
+        "correct": bool(correct),
+        "answered_at": time.time(),
+    })
+
+
+def flush(timeout=5.0):
+    """Block until everything queued so far is committed; False on timeout."""
+    _ensure_writer()
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+
+def _collect():
+    """The next batch: waits for one item, then up to the size or time trigger."""
+    batch = [_queue.get()]
+    deadline = time.monotonic() + ATTEMPTS_FLUSH_INTERVAL_S
+    while len(batch) < ATTEMPTS_BATCH_SIZE:
+        if isinstance(batch[-1], threading.Event):
+            break   # someone is waiting on a flush; commit now
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(attempts):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            record_attempts(attempts)
+            WRITTEN.inc(len(attempts))
+            BATCH_SIZE.observe(len(attempts))
+            return
+        except Exception as e:
+            logger.error("attempt batch of %d failed (try %d): %s", len(attempts), attempt + 1, e)
+            time.sleep(0.1 * 2 ** attempt)
+    DROPPED.inc(len(attempts))
+
+
+def _run():
+    while True:
+        batch = _collect()
+        attempts = [item for item in batch if not isinstance(item, threading.Event)]
+        if attempts:
+            _write(attempts)
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+
+atexit.register(flush)
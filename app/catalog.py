@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import defaultdict
+from .connection import fetchall
+from .question_index import VERSION_CHECK_S, bank_version, unseen_rows
+
+_lock = threading.Lock()
+_counts = {}        # (document_id, category, difficulty) -> question count; None = PDF_PATH
+# The `documents` scope of quizzes and refills that are not scoped to the corpus
+CHAPTER = (None,)
+_max_id = 0
+_loaded = False
+_generation = 0     # bumped whenever a count changes
+_version = None     # bank_version the counts were taken under
+_checked_at = 0.0
+
+
+def refresh():
+    """Fold in rows inserted since the last load, including by other processes.
+
+    Only rows above the highest id seen are counted, so after the first load
+    this is a short range scan on the primary key rather than a table scan.
+    When another process has deleted questions since (bank_version moved),
+    everything is counted again.
+    """
+    global _max_id, _loaded, _generation, _version, _checked_at
+    version = bank_version()
+    with _lock:
+        if version != _version:
+            _counts.clear()
+            _max_id = 0
+            _version = version
+            _generation += 1
+        since = _max_id
+        _checked_at = time.monotonic()
+    rows = fetchall('''
+        SELECT document_id, category, difficulty_level, COUNT(*), MAX(id)
+        FROM questions
+        WHERE id > ?
+        GROUP BY document_id, category, difficulty_level
+    ''', (since,))
+    with _lock:
+        # Another thread may have folded in the same range, or started a recount, meanwhile
+        if _max_id == since and _version == version:
+            for doc, cat, diff, count, top in rows:
+                _counts[(doc, cat, diff)] = _counts.get((doc, cat, diff), 0) + count
+                _max_id = max(_max_id, top)
+            _generation += bool(rows)
+        _loaded = True
+    return len(rows)
+
+
+def _ensure_loaded():
+    if not _loaded or time.monotonic() - _checked_at >= VERSION_CHECK_S:
+        refresh()
+
+
+def add(rows):
+    """Count freshly inserted (id, difficulty_level, category, document_id) rows."""
+    global _max_id, _generation
+    if not _loaded:
+        return
+    with _lock:
+        since, version = _max_id, _version
+    rows = unseen_rows(rows, since)
+    with _lock:
+        for qid, diff, cat, doc in rows:
+            if qid > _max_id and _version == version:
+                _counts[(doc, cat, diff)] = _counts.get((doc, cat, diff), 0) + 1
+                _max_id = qid
+                _generation += 1
+
+
+def remove(rows):
+    """Uncount deleted (id, difficulty_level, category, document_id) rows."""
+    global _generation
+    with _lock:
+        for qid, diff, cat, doc in rows:
+            key = (doc, cat, diff)
+            if qid <= _max_id and _counts.get(key):
+                _counts[key] -= 1
+                _generation += 1
+                if not _counts[key]:
+                    del _counts[key]
+
+
+def generation():
+    """Changes whenever any count does; cheap enough to check per request."""
+    _ensure_loaded()
+    return _generation
+
+
+def counts(documents=None):
+    """{(category, difficulty): question count} for every non-empty bucket.
+
+    `documents` limits the counts to questions from those document ids.
+    """
+    _ensure_loaded()
+    scope = None if documents is None else set(documents)
+    totals = defaultdict(int)
+    with _lock:
+        for (doc, cat, diff), n in _counts.items():
+            if scope is None or doc in scope:
+                totals[(cat, diff)] += n
+    return dict(totals)
+
+
+def count(category, difficulty, documents=None):
+    return counts(documents).get((category, difficulty), 0)
+
+
+def categories(documents=None):
+    """Every category that has at least one question, sorted."""
+    return sorted(category_counts(documents))
+
+
+def category_counts(documents=None):
+    totals = defaultdict(int)
+    for (cat, _), n in counts(documents).items():
+        totals[cat] += n
+    return dict(totals)
+
+
+def difficulty_counts(documents=None):
+    totals = defaultdict(int)
+    for (_, diff), n in counts(documents).items():
+        totals[diff] += n
+    return dict(totals)
+
+
+def document_counts():
+    """{document_id: question count}."""
+    _ensure_loaded()
+    totals = defaultdict(int)
+    with _lock:
+        for (doc, _, _), n in _counts.items():
+            totals[doc] += n
+    return dict(totals)
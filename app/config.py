@@ -8,7 +8,93 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "supersecret")
 DB_PATH = os.path.join(PROJECT_ROOT, os.getenv("DB_PATH"))
 PDF_PATH = os.path.join(PROJECT_ROOT, os.getenv("PDF_PATH"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Server-side session storage: "sqlite" (shared by all workers), "memory" or "redis"
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# An unchanged session is rewritten (and its cookie re-sent) at most this often to extend its expiry
+SESSION_TOUCH_INTERVAL_S = int(os.getenv("SESSION_TOUCH_INTERVAL_S", "300"))
+# Category weighting: half-life (days) for the "not practised recently" boost,
+# and whether to refine the local weights with the LLM in the background
+WEIGHTS_RECENCY_HALF_LIFE_DAYS = float(os.getenv("WEIGHTS_RECENCY_HALF_LIFE_DAYS", "7"))
+WEIGHTS_LLM_REFINE = os.getenv("WEIGHTS_LLM_REFINE", "false").lower() in ("1", "true", "yes")
+# Cached weights are recomputed after this long, picking up changes made by other workers
+WEIGHTS_CACHE_TTL_S = float(os.getenv("WEIGHTS_CACHE_TTL_S", "60"))
+STUDY_PLAN_WORKERS = int(os.getenv("STUDY_PLAN_WORKERS", "2"))
+# LLM gateway: per-call deadline, retries, concurrency and circuit breaker.
+# LLM_BACKEND=fake swaps Gemini for the deterministic local fake.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "genai")
+LLM_FAKE_LATENCY_S = float(os.getenv("LLM_FAKE_LATENCY_S", "0"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+# Persistent LLM response cache (llm_cache table)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+# Reject new questions whose prompt is this similar (estimated Jaccard) to a stored one
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# Directory of PDFs ingested by `python -m app.corpus`; sub-directories are courses
+CORPUS_DIR = os.path.join(PROJECT_ROOT, os.getenv("CORPUS_DIR", "data/corpus"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# /answer outcomes are group-committed when this many are queued or the oldest is this old
+ATTEMPTS_BATCH_SIZE = int(os.getenv("ATTEMPTS_BATCH_SIZE", "100"))
+ATTEMPTS_FLUSH_INTERVAL_S = float(os.getenv("ATTEMPTS_FLUSH_INTERVAL_S", "0.5"))
+# "async" serves the app through app.asgi so LLM waits do not hold worker threads;
+# ASGI_THREADS bounds the threads that run views in that mode
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "8"))
+# Logging: default level, per-module overrides ("replenish=WARNING,quiz=DEBUG"), the
+# rotated JSON-lines file ("" for console only), and sample rates per event ("request=0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "request=0.1")
+# Requests at least this slow are always logged, at WARNING
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+# Password hashing: werkzeug method string for new hashes (older ones are re-hashed on login),
+# pool processes per server process (0 hashes on the request thread; the default splits the
+# CPUs between the WEB_CONCURRENCY workers), hashes queued before /login and /register answer
+# 503, and how long one may wait
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or
+                            max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY") or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING") or PASSWORD_HASH_WORKERS * 4)
+PASSWORD_HASH_TIMEOUT_S = float(os.getenv("PASSWORD_HASH_TIMEOUT_S", "5"))
+# Failed logins per username within the window before further attempts get 429
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW_S = float(os.getenv("LOGIN_FAILURE_WINDOW_S", "300"))
+# /stock, /db_stats, /llm_stats and /metrics answer only requests sending
+# "Authorization: Bearer <token>" with this token; they are off while it is unset
+DIAGNOSTICS_TOKEN = os.getenv("DIAGNOSTICS_TOKEN", "")
+# Add a Server-Timing header (db/llm/total) to every response
+METRICS_TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+PDF_CACHE_DIR = os.path.join(PROJECT_ROOT, os.getenv("PDF_CACHE_DIR", "data/cache"))
+# Passages sent per question-generation prompt; 0 sends the whole chapter
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
 MODEL_NAME = os.getenv("MODEL_NAME")
 PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("LOCATION")
-NUM_QUESTIONS_PER_QUIZ = int(os.getenv("NUM_QUESTIONS_PER_QUIZ"))
\ No newline at end of file
+NUM_QUESTIONS_PER_QUIZ = int(os.getenv("NUM_QUESTIONS_PER_QUIZ"))
+
+# Question-bank replenishment: buckets below the low watermark are topped up
+# in the background until they reach the high watermark.
+REPLENISH_LOW_WATERMARK = int(os.getenv("REPLENISH_LOW_WATERMARK", NUM_QUESTIONS_PER_QUIZ))
+REPLENISH_HIGH_WATERMARK = int(os.getenv("REPLENISH_HIGH_WATERMARK", 2 * NUM_QUESTIONS_PER_QUIZ))
+REPLENISH_WORKERS = int(os.getenv("REPLENISH_WORKERS", "2"))
+# Stream single-bucket refills so each question is stored as soon as it is generated,
+# and how long /question may wait for one when no stocked question is left at all
+REPLENISH_STREAMING = os.getenv("REPLENISH_STREAMING", "true").lower() in ("1", "true", "yes")
+REPLENISH_FIRST_QUESTION_WAIT_S = float(os.getenv("REPLENISH_FIRST_QUESTION_WAIT_S", "15"))
+# Background top-ups pack several short buckets into one LLM call
+REPLENISH_BATCH_BUCKETS = int(os.getenv("REPLENISH_BATCH_BUCKETS", "6"))
+REPLENISH_BATCH_QUESTIONS = int(os.getenv("REPLENISH_BATCH_QUESTIONS", "60"))
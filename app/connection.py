@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from .config import DB_PATH, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SLOW_QUERY_MS
+from .logger import logger
+from .metrics import Histogram, add_request_time
+
+# Per-connection statement cache; repeated SQL reuses the prepared statement
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_query_stats = {}   # normalised sql -> [count, total_seconds, max_seconds]
+_labels = {}        # normalised sql -> short "VERB table" metric label
+
+SQL_LATENCY = Histogram("quiz_sql_seconds", "SQLite statement latency", ["statement"])
+_TABLE_KEYWORDS = {"FROM", "INTO", "UPDATE", "TABLE"}
+_SKIP_WORDS = {"IF", "NOT", "EXISTS"}
+
+
+def statement_label(sql):
+    """A low-cardinality label such as "SELECT questions" for a statement."""
+    words = [w for w in sql.replace("(", " ").split() if w.upper() not in _SKIP_WORDS]
+    verb = words[0].upper() if words else ""
+    for prev, word in zip(words, words[1:]):
+        if prev.upper() in _TABLE_KEYWORDS:
+            return f"{verb} {word}"
+    return " ".join(words[:2]).upper()
+
+
+def _connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,   # autocommit; writes go through transaction()
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_conn():
+    """The calling thread's connection, reopened after a fork."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+    return conn
+
+
+def close_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def _record(sql, elapsed):
+    key = " ".join(sql.split())
+    label = _labels.get(key)
+    if label is None:
+        label = _labels[key] = statement_label(key)
+    SQL_LATENCY.observe(elapsed, statement=label)
+    add_request_time("db", elapsed)
+    with _stats_lock:
+        entry = _query_stats.get(key)
+        if entry is None:
+            entry = _query_stats[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("slow query (%.1f ms): %s", elapsed * 1000, key)
+
+
+def execute(sql, params=()):
+    start = time.perf_counter()
+    try:
+        return get_conn().execute(sql, params)
+    finally:
+        _record(sql, time.perf_counter() - start)
+
+
+def executemany(sql, seq_of_params):
+    start = time.perf_counter()
+    try:
+        return get_conn().executemany(sql, seq_of_params)
+    finally:
+        _record(sql, time.perf_counter() - start)
+
+
+def fetchone(sql, params=()):
+    return execute(sql, params).fetchone()
+
+
+def fetchall(sql, params=()):
+    return execute(sql, params).fetchall()
+
+
+@contextmanager
+def transaction():
+    """Group writes into one IMMEDIATE transaction; nested uses join the outer one."""
+    conn = get_conn()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+    execute("BEGIN IMMEDIATE")
+    _local.depth = 1
+    try:
+        yield conn
+        execute("COMMIT")
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.depth = 0
+
+
+def query_stats():
+    """Per-statement call counts and timings, slowest total first."""
+    with _stats_lock:
+        items = [(sql, *entry) for sql, entry in _query_stats.items()]
+    items.sort(key=lambda item: item[2], reverse=True)
+    return [
+        {"sql": sql, "count": count, "total_ms": total * 1000,
+         "avg_ms": total / count * 1000, "max_ms": worst * 1000}
+        for sql, count, total, worst in items
+    ]
@@ -0,0 +1,176 @@
+"""Incremental ingestion of a directory of PDFs into documents and pages.
+
+Each PDF under CORPUS_DIR becomes a document tagged with its course (the
+first sub-directory, or "general" for files at the top level). A re-run
+skips files whose hash is unchanged; for changed files, only pages whose
+content hash differs are re-extracted. Page ranges are scanned in a
+process pool, so large corpora use every core.
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .config import CORPUS_DIR, INGEST_WORKERS
+from .connection import execute, executemany, fetchall, fetchone, transaction
+from .logger import logger
+from .pdf_cache import cache_path, file_hash, write_cache
+
+PAGES_PER_TASK = 25
+DEFAULT_COURSE = "general"
+
+_paths = {}     # document id -> absolute path
+
+
+def _stored_path(path):
+    """Path relative to CORPUS_DIR when inside it, so the corpus can be moved."""
+    rel = os.path.relpath(path, CORPUS_DIR)
+    return os.path.abspath(path) if rel.startswith(os.pardir) else rel
+
+
+def discover(root=CORPUS_DIR):
+    """(stored path, course) of every PDF under `root`, sorted."""
+    found = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(dirpath, name)
+                parts = os.path.relpath(path, root).split(os.sep)
+                found.append((_stored_path(path), parts[0] if len(parts) > 1 else DEFAULT_COURSE))
+    return sorted(found)
+
+
+def page_hash(page):
+    """Hash of what a page draws: its content stream and the fonts it uses."""
+    h = hashlib.sha256(page.read_contents())
+    h.update(repr(page.get_fonts()).encode("utf-8"))
+    return h.hexdigest()
+
+
+def scan_pages(path, start, end, known):
+    """(page_no, hash, text) for pages [start, end); text is None when `known` has the hash.
+
+    Runs in a worker process.
+    """
+    import fitz
+    results = []
+    with fitz.open(path) as doc:
+        for page_no in range(start, min(end, doc.page_count)):
+            page = doc[page_no]
+            digest = page_hash(page)
+            results.append((page_no, digest, None if known.get(page_no) == digest else page.get_text()))
+    return results
+
+
+def _page_count(path):
+    import fitz
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _store(rel, course, digest, page_count, scanned, document_id):
+    """Write one document's changed pages and refresh its parsed-page cache."""
+    now = time.time()
+    with transaction():
+        if document_id is None:
+            document_id = execute('''
+                INSERT INTO documents (path, course, file_hash, page_count, ingested_at) VALUES (?, ?, ?, ?, ?)
+            ''', (rel, course, digest, page_count, now)).lastrowid
+        else:
+            execute("UPDATE documents SET course = ?, file_hash = ?, page_count = ?, ingested_at = ? WHERE id = ?",
+                    (course, digest, page_count, now, document_id))
+        executemany("INSERT OR REPLACE INTO document_pages (document_id, page_no, page_hash, text) VALUES (?, ?, ?, ?)",
+                    [(document_id, page_no, h, text) for page_no, h, text in scanned if text is not None])
+        execute("DELETE FROM document_pages WHERE document_id = ? AND page_no >= ?", (document_id, page_count))
+        pages = [row[0] for row in fetchall(
+            "SELECT text FROM document_pages WHERE document_id = ? ORDER BY page_no", (document_id,))]
+    # Retrieval and parse_pdf read the memory-mapped cache, not the database
+    write_cache(cache_path(digest), pages)
+    return document_id
+
+
+def ingest(root=CORPUS_DIR, workers=INGEST_WORKERS, force=False):
+    """Bring the documents tables in line with the PDFs under `root`.
+
+    Idempotent: unchanged files are skipped without being opened. Returns
+    counts of documents added, updated and unchanged and of pages extracted
+    and reused.
+    """
+    existing = {row[1]: (row[0], row[2]) for row in fetchall("SELECT id, path, file_hash FROM documents")}
+    summary = {"added": 0, "updated": 0, "unchanged": 0, "pages_extracted": 0, "pages_reused": 0}
+    todo = []
+    for rel, course in discover(root):
+        path = os.path.join(CORPUS_DIR, rel)
+        digest = file_hash(path)
+        document_id, old_digest = existing.get(rel, (None, None))
+        if old_digest == digest and not force:
+            summary["unchanged"] += 1
+            continue
+        known = {} if force or document_id is None else dict(fetchall(
+            "SELECT page_no, page_hash FROM document_pages WHERE document_id = ?", (document_id,)))
+        todo.append((rel, course, path, digest, document_id, known, _page_count(path)))
+    if not todo:
+        return summary
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            [pool.submit(scan_pages, path, start, start + PAGES_PER_TASK, known)
+             for start in range(0, page_count, PAGES_PER_TASK)]
+            for rel, course, path, digest, document_id, known, page_count in todo
+        ]
+        for (rel, course, path, digest, document_id, known, page_count), parts in zip(todo, futures):
+            scanned = [row for part in parts for row in part.result()]
+            extracted = sum(text is not None for _, _, text in scanned)
+            _store(rel, course, digest, page_count, scanned, document_id)
+            summary["updated" if document_id else "added"] += 1
+            summary["pages_extracted"] += extracted
+            summary["pages_reused"] += len(scanned) - extracted
+            logger.info("ingested %s (%s): %d of %d pages extracted", rel, course, extracted, page_count)
+    return summary
+
+
+def list_documents(course=None):
+    rows = fetchall('''
+        SELECT id, path, course, page_count, ingested_at FROM documents
+        WHERE ? IS NULL OR course = ?
+        ORDER BY course, path
+    ''', (course, course))
+    return [{"id": r[0], "path": r[1], "course": r[2], "page_count": r[3], "ingested_at": r[4]} for r in rows]
+
+
+def document_ids(document=None, course=None):
+    """Ids of the documents a quiz is scoped to: one document, a course, or None for everything."""
+    if document is not None:
+        row = fetchone("SELECT id FROM documents WHERE id = ? OR path = ?", (document, document))
+        return [row[0]] if row else []
+    if course is not None:
+        return [row[0] for row in fetchall("SELECT id FROM documents WHERE course = ? ORDER BY id", (course,))]
+    return None
+
+
+def document_path(document_id):
+    path = _paths.get(document_id)
+    if path is None:
+        row = fetchone("SELECT path FROM documents WHERE id = ?", (document_id,))
+        if row is None:
+            raise KeyError(f"Unknown document {document_id}")
+        path = _paths[document_id] = os.path.join(CORPUS_DIR, row[0])
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs into the question-bank corpus.")
+    parser.add_argument("root", nargs="?", default=CORPUS_DIR)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--force", action="store_true", help="re-extract every page of every file")
+    parser.add_argument("--generate", action="store_true", help="seed questions for documents that have none")
+    args = parser.parse_args()
+    from .models import init_db
+    init_db()
+    start = time.perf_counter()
+    print(ingest(args.root, args.workers, args.force), f"in {time.perf_counter() - start:.2f}s")
+    if args.generate:
+        from .replenish import refill_document
+        for doc in list_documents():
+            refill_document(doc["id"])
@@ -1,41 +1,41 @@
 import sqlite3
 from collections import defaultdict
-from .config import DB_PATH, NUM_QUESTIONS_PER_QUIZ
+from .config import NUM_QUESTIONS_PER_QUIZ, DEDUP_ENABLED
+from .connection import execute, executemany, fetchone, fetchall, transaction
+from . import catalog
+from . import dedup
+from . import profile_cache
+from . import question_index
+from . import weights
+from .logger import logger
+from .models import dump_choices
+import time
 
-import json
 def get_all_categories():
-    query = "SELECT DISTINCT(category) from questions"
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute(query)
-        return [row[0] for row in cur.fetchall()]
+    return catalog.categories()
     
 def get_llm_input(user_id=1):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute('''
-                    SELECT category, correct, total, last_study_plan 
+        rows = fetchall('''
+                    SELECT category, correct, total
                     FROM user_category_stats 
                     WHERE user_id = ?
                     ''', (user_id,))
-        rows = cur.fetchall()
-        conn.close()
 
         if not rows:
-            print("No category data available for user_id:", user_id)
+            logger.debug("No category data available for user_id: %s", user_id)
             return {"stats": [], "last_study_plan": ""}
 
-        last_study_plan = rows[0][3] or ""  # Handle possible None
+        last_study_plan = get_latest_study_plan(user_id) or ""
         stats = []
 
-        for cat, correct, total, _ in rows:
+        for cat, correct, total in rows:
             stats.append({
                 "category": cat,
                 "correct": correct,
                 "total": total
             })
-        existing_categories = [i["category"] for i in stats]
+        existing_categories = {i["category"] for i in stats}
         all_categories = get_all_categories()
         
         for cat in all_categories:
@@ -51,75 +51,94 @@ def get_llm_input(user_id=1):
             "last_study_plan": last_study_plan
         }
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         return {"stats": [], "last_study_plan": ""}
   
 
   
   
 def get_latest_study_plan(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT last_study_plan FROM user_category_stats WHERE user_id = ? LIMIT 1", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    row = fetchone("SELECT plan FROM study_plans WHERE user_id = ? ORDER BY id DESC LIMIT 1", (user_id,))
     return row[0] if row else None
 
+def get_study_plan_for_quiz(user_id, quiz_id):
+    row = fetchone("SELECT plan FROM study_plans WHERE user_id = ? AND quiz_id = ? ORDER BY id DESC LIMIT 1",
+                   (user_id, quiz_id))
+    return row[0] if row else None
+
+def get_study_plan_history(user_id, limit=10):
+    rows = fetchall("SELECT plan, created_at FROM study_plans WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit))
+    return [{"plan": plan, "created_at": created_at} for plan, created_at in rows]
+
 def save_questions(questions):
     if not questions:
-        print("No questions to store.")
+        logger.debug("No questions to store.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    values = []
-    for qa in questions:
-        values.append((
-            qa['answer'],
-            qa['prompt'],
-            qa['question_type'],
-            qa['hint'],
-            qa['explanation'],
-            json.dumps(qa.get('choices', [])),
-            qa.get('difficulty_level', 'medium'),
-            qa.get('category', 'general')
-        ))
-
-    cur.executemany('''
-        INSERT INTO questions (
-            answer, prompt, question_type, hint, explanation, choices,
-            difficulty_level, category
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', values)
-    conn.commit()
-    conn.close()
+    # The IMMEDIATE transaction holds the write lock, so every row above
+    # the previous max id is one of ours, and near-duplicate checks see
+    # everything other processes have stored
+    with transaction():
+        if DEDUP_ENABLED:
+            questions, signatures = dedup.filter_new(questions)
+            if not questions:
+                return []
+
+        values = []
+        for qa in questions:
+            values.append((
+                qa['answer'],
+                qa['prompt'],
+                qa['question_type'],
+                qa['hint'],
+                qa['explanation'],
+                dump_choices(qa.get('choices', [])),
+                qa.get('difficulty_level', 'medium'),
+                qa.get('category', 'general'),
+                qa.get('document_id')
+            ))
+
+        before = fetchone("SELECT COALESCE(MAX(id), 0) FROM questions")[0]
+        executemany('''
+            INSERT INTO questions (
+                answer, prompt, question_type, hint, explanation, choices,
+                difficulty_level, category, document_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', values)
+        inserted = fetchall("SELECT id, difficulty_level, category, document_id FROM questions WHERE id > ? ORDER BY id",
+                            (before,))
+        if DEDUP_ENABLED:
+            dedup.store([row[0] for row in inserted], signatures)
+    categories = set(catalog.categories())
+    question_index.add(inserted)
+    catalog.add(inserted)
+    # Weights span every category, so only a new category changes them
+    if not categories.issuperset(catalog.categories()):
+        weights.invalidate()
+    return [row[0] for row in inserted]
     
 def update_user_stats(user_id, category, correct):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO user_category_stats (user_id, category, correct, total)
-        VALUES (?, ?, ?, 1)
-        ON CONFLICT(user_id, category) DO UPDATE SET
-            correct = correct + ?,
-            total = total + 1
-    ''', (user_id, category, 1 if correct else 0, 1 if correct else 0))
-    conn.commit()
-    conn.close()
-
-def save_study_plan(user_id, plan):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE user_category_stats SET last_study_plan = ? WHERE user_id = ?", (plan, user_id))
-    conn.commit()
-    conn.close()
+    with transaction():
+        execute('''
+            INSERT INTO user_category_stats (user_id, category, correct, total, updated_at)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(user_id, category) DO UPDATE SET
+                correct = correct + ?,
+                total = total + 1,
+                updated_at = excluded.updated_at
+        ''', (user_id, category, 1 if correct else 0, time.time(), 1 if correct else 0))
+        profile_cache.invalidate(user_id)
+    weights.invalidate(user_id)
+
+def save_study_plan(user_id, plan, quiz_id=None):
+    with transaction():
+        execute("INSERT INTO study_plans (user_id, plan, created_at, quiz_id) VALUES (?, ?, ?, ?)",
+                (user_id, plan, time.time(), quiz_id))
+        profile_cache.invalidate(user_id)
+    weights.invalidate(user_id)
     
 def get_username(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT username FROM users WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    row = fetchone("SELECT username FROM users WHERE id = ?", (user_id,))
     return row[0] if row else "User"
 
 def batch_update_user_stats(user_id, history):
@@ -127,9 +146,6 @@ def batch_update_user_stats(user_id, history):
     if not history:
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
     # Aggregate counts from history
     category_counts = defaultdict(lambda: {"correct": 0, "total": 0})
     for item in history:
@@ -139,25 +155,69 @@ def batch_update_user_stats(user_id, history):
         category_counts[cat]["total"] += 1
 
     # Update DB for each category
-    for cat, counts in category_counts.items():
-        cur.execute('''
-            INSERT INTO user_category_stats (user_id, category, correct, total)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id, category) DO UPDATE SET
-                correct = correct + ?,
-                total = total + ?
-        ''', (user_id, cat, counts["correct"], counts["total"], counts["correct"], counts["total"]))
-
-    conn.commit()
-    conn.close()
+    now = time.time()
+    with transaction():
+        for cat, counts in category_counts.items():
+            execute('''
+                INSERT INTO user_category_stats (user_id, category, correct, total, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, category) DO UPDATE SET
+                    correct = correct + ?,
+                    total = total + ?,
+                    updated_at = excluded.updated_at
+            ''', (user_id, cat, counts["correct"], counts["total"], now, counts["correct"], counts["total"]))
+        profile_cache.invalidate(user_id)
+    weights.invalidate(user_id)
     
+def record_attempts(attempts):
+    """Append answer attempts and roll them into the per-category and per-question stats.
+
+    Everything happens in one transaction, so the log and the rollups never
+    disagree. Attempts are dicts with user_id, question_id, quiz_id,
+    category, difficulty_level, correct and answered_at.
+    """
+    by_user = defaultdict(list)
+    by_question = defaultdict(lambda: [0, 0, 0.0])
+    for a in attempts:
+        by_user[a["user_id"]].append(a)
+        if a.get("question_id") is not None:
+            q = by_question[a["question_id"]]
+            q[0] += 1
+            q[1] += 1 if a["correct"] else 0
+            q[2] = max(q[2], a["answered_at"])
+    with transaction():
+        executemany('''
+            INSERT INTO attempts (user_id, question_id, quiz_id, category, difficulty_level, correct, answered_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(a["user_id"], a.get("question_id"), a.get("quiz_id"), a.get("category", "general"),
+               a.get("difficulty_level"), 1 if a["correct"] else 0, a["answered_at"]) for a in attempts])
+        for user_id, history in by_user.items():
+            batch_update_user_stats(user_id, history)
+        executemany('''
+            INSERT INTO question_stats (question_id, attempts, correct, last_attempt_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(question_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                correct = correct + excluded.correct,
+                last_attempt_at = MAX(COALESCE(last_attempt_at, 0), excluded.last_attempt_at)
+        ''', [(qid, n, c, ts) for qid, (n, c, ts) in by_question.items()])
+    # Invalidate again now the rollups are visible to other connections
+    for user_id in by_user:
+        weights.invalidate(user_id)
+
+def get_question_stats(question_id):
+    row = fetchone("SELECT attempts, correct, last_attempt_at FROM question_stats WHERE question_id = ?", (question_id,))
+    if row is None:
+        return {"attempts": 0, "correct": 0, "correct_rate": None, "last_attempt_at": None}
+    return {"attempts": row[0], "correct": row[1], "correct_rate": row[1] / row[0] if row[0] else None,
+            "last_attempt_at": row[2]}
+
 def get_user_stats(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT category, correct, total FROM user_category_stats WHERE user_id = ?", (user_id,))
-    stats = {row[0]: {"correct": row[1], "total": row[2], "accuracy": (row[1] / row[2] * 100) if row[2] > 0 else 0} for row in cur.fetchall()}
+    rows = fetchall("SELECT category, correct, total FROM user_category_stats WHERE user_id = ?", (user_id,))
+    available = catalog.category_counts()
+    stats = {row[0]: {"correct": row[1], "total": row[2], "accuracy": (row[1] / row[2] * 100) if row[2] > 0 else 0,
+                      "available": available.get(row[0], 0)} for row in rows}
     overall_correct = sum(s["correct"] for s in stats.values())
     overall_total = sum(s["total"] for s in stats.values())
     overall_accuracy = (overall_correct / overall_total * 100) if overall_total > 0 else 0
-    conn.close()
-    return {"categories": stats, "overall_accuracy": overall_accuracy, "total_quizzes": overall_total // NUM_QUESTIONS_PER_QUIZ}
+    return {"categories": stats, "overall_accuracy": overall_accuracy, "total_quizzes": overall_total // NUM_QUESTIONS_PER_QUIZ,
+            "total_categories": len(available), "total_questions": sum(available.values())}
@@ -0,0 +1,244 @@
+"""Near-duplicate detection for question prompts with MinHash and LSH.
+
+Prompts are normalised and cut into word shingles; a MinHash signature of
+NUM_PERM values estimates the Jaccard similarity of two shingle sets. The
+signature is split into BANDS bands of ROWS values, and prompts that share
+any band are compared in full, so a lookup touches only a handful of
+candidates however large the bank grows.
+"""
+import hashlib
+import random
+import re
+import threading
+from array import array
+from .config import DEDUP_THRESHOLD
+from .connection import execute, executemany, fetchall, transaction
+from .logger import logger
+from .metrics import Counter
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4
+SHINGLE_WORDS = 3
+
+_MERSENNE = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_rng = random.Random(1729)      # fixed seed: persisted signatures must stay comparable
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+class LSHIndex:
+    """Signatures bucketed by band, for finding near-duplicates of a signature."""
+
+    def __init__(self):
+        self.signatures = {}    # question id -> signature
+        self.bands = {}         # (band, band values) -> question ids
+
+    def add(self, question_id, sig):
+        self.signatures[question_id] = sig
+        for key in _band_keys(sig):
+            self.bands.setdefault(key, []).append(question_id)
+
+    def remove(self, question_id):
+        sig = self.signatures.pop(question_id, None)
+        if sig is None:
+            return
+        for key in _band_keys(sig):
+            ids = self.bands.get(key)
+            if ids and question_id in ids:
+                ids.remove(question_id)
+                if not ids:
+                    del self.bands[key]
+
+    def match(self, sig, threshold):
+        """Id of an indexed signature at least `threshold` similar to `sig`, or None."""
+        seen = set()
+        for key in _band_keys(sig):
+            for qid in self.bands.get(key, ()):
+                if qid in seen:
+                    continue
+                seen.add(qid)
+                if similarity(sig, self.signatures[qid]) >= threshold:
+                    return qid
+        return None
+
+
+_lock = threading.Lock()
+_index = LSHIndex()
+_max_seq = 0        # highest question_signatures.seq loaded
+_loaded = False
+
+# seq numbers signatures in commit order (writers hold the database write lock),
+# so signatures backfilled for old questions still sort after the last load
+_INSERT_SQL = '''
+    INSERT OR REPLACE INTO question_signatures (question_id, signature, seq)
+    VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM question_signatures))
+'''
+
+REJECTED = Counter("quiz_dedup_rejected_total", "Questions rejected as near-duplicates", ["stage"])
+
+
+def normalise(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+def shingles(text):
+    words = normalise(text).split()
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+              for s in shingles(text)]
+    return array("I", (min(((a * h + b) % _MERSENNE) & _MASK for h in hashes) for a, b in _PERMS))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def _band_keys(sig):
+    return [(band, tuple(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+def refresh():
+    """Load signatures persisted since the last load, including by other processes."""
+    global _loaded, _max_seq
+    with _lock:
+        since = _max_seq
+    rows = fetchall("SELECT question_id, signature, seq FROM question_signatures WHERE seq > ? ORDER BY seq",
+                    (since,))
+    with _lock:
+        for qid, blob, seq in rows:
+            if qid not in _index.signatures:
+                _index.add(qid, array("I", blob))
+            _max_seq = max(_max_seq, seq)
+        _loaded = True
+    return len(rows)
+
+
+def find_duplicate(text, threshold=DEDUP_THRESHOLD):
+    """Id of a stored question whose prompt is a near-duplicate of `text`, or None."""
+    if not _loaded:
+        refresh()
+    sig = signature(text)
+    with _lock:
+        return _index.match(sig, threshold)
+
+
+def filter_new(questions, threshold=DEDUP_THRESHOLD):
+    """(fresh questions, their signatures) with near-duplicates dropped.
+
+    A question is dropped when it matches one already stored or an earlier
+    one in the same batch. Call inside the inserting transaction so
+    signatures other processes committed meanwhile are seen.
+    """
+    refresh()
+    sigs = [signature(qa["prompt"]) for qa in questions]
+    fresh, kept, batch = [], [], LSHIndex()
+    with _lock:
+        for i, (qa, sig) in enumerate(zip(questions, sigs)):
+            if _index.match(sig, threshold) is not None:
+                REJECTED.inc(stage="bank")
+            elif batch.match(sig, threshold) is not None:
+                REJECTED.inc(stage="batch")
+            else:
+                batch.add(i, sig)
+                fresh.append(qa)
+                kept.append(sig)
+    return fresh, kept
+
+
+def store(question_ids, sigs):
+    """Persist and index signatures of freshly inserted questions."""
+    executemany(_INSERT_SQL, [(qid, sig.tobytes()) for qid, sig in zip(question_ids, sigs)])
+    with _lock:
+        for qid, sig in zip(question_ids, sigs):
+            _index.add(qid, sig)
+
+
+def dedupe_bank(threshold=DEDUP_THRESHOLD, delete=True, chunk=5000):
+    """Sign every unsigned question and, if `delete`, drop near-duplicates of older ones.
+
+    Questions are visited in id order, so the oldest copy is the one kept.
+    Without `delete` only unsigned questions are read. Returns (signed,
+    removed) counts.
+    """
+    from . import catalog, question_index
+
+    refresh()
+    kept = LSHIndex()
+    signed = removed = 0
+    categories_changed = False
+    last = 0
+    while True:
+        rows = fetchall(f'''
+            SELECT q.id, q.prompt, q.difficulty_level, q.category, q.document_id, s.signature FROM questions q
+            LEFT JOIN question_signatures s ON s.question_id = q.id
+            WHERE q.id > ? {"" if delete else "AND s.question_id IS NULL"}
+            ORDER BY q.id LIMIT ?
+        ''', (last, chunk))
+        if not rows:
+            break
+        last = rows[-1][0]
+        new, doomed = [], []
+        for qid, prompt, diff, cat, doc, blob in rows:
+            sig = array("I", blob) if blob is not None else signature(prompt or "")
+            if delete and kept.match(sig, threshold) is not None:
+                doomed.append((qid, diff, cat, doc))
+                continue
+            if delete:
+                kept.add(qid, sig)
+            if blob is None:
+                new.append((qid, sig))
+        with transaction():
+            executemany(_INSERT_SQL, [(qid, sig.tobytes()) for qid, sig in new])
+            if doomed:
+                executemany("DELETE FROM questions WHERE id = ?", [(qid,) for qid, *_ in doomed])
+                executemany("DELETE FROM question_signatures WHERE question_id = ?", [(qid,) for qid, *_ in doomed])
+                # Other processes' indexes and counts still hold these ids; this tells them to reload
+                execute("UPDATE bank_version SET version = version + 1")
+        with _lock:
+            for qid, sig in new:
+                _index.add(qid, sig)
+            for qid, *_ in doomed:
+                _index.remove(qid)
+        if doomed:
+            question_index.remove([qid for qid, *_ in doomed])
+            categories = set(catalog.categories())
+            catalog.remove(doomed)
+            categories_changed = categories_changed or categories != set(catalog.categories())
+        signed += len(new)
+        removed += len(doomed)
+    if categories_changed:
+        # Weights span every category, so only losing one changes them
+        from . import weights
+        weights.invalidate()
+    logger.info("dedupe: signed %d questions, removed %d near-duplicates", signed, removed)
+    return signed, removed
+
+
+_backfill = None
+
+
+def schedule_backfill():
+    """Sign questions stored before dedup existed, in the background; deletes nothing."""
+    global _backfill
+    if _backfill is None:
+        from .jobs import JobQueue
+        _backfill = JobQueue("dedup", 1)
+    return _backfill.submit("backfill", dedupe_bank, delete=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sign the question bank and remove near-duplicate prompts.")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="only sign questions, delete nothing")
+    args = parser.parse_args()
+    from .models import init_db
+    init_db()
+    signed, removed = dedupe_bank(args.threshold, delete=not args.dry_run)
+    print(f"signed {signed} questions, removed {removed} near-duplicates")
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, prompt=""):
+        self.text = text
+        # Rough 4-characters-per-token estimate, like the real usage metadata
+        self.usage_metadata = FakeUsage(len(prompt) // 4, len(text) // 4)
+
+
+class FakeBackend:
+    """Deterministic local stand-in for the Gemini client.
+
+    Answers the app's three kinds of request: question generation (any call
+    with a response_schema), category weights (JSON without a schema) and
+    study plans (plain text). `latency` seconds are slept per call, plus
+    `latency_per_kchar` per 1000 prompt characters to mimic token-bound
+    cost, and `fail_every` makes every n-th call raise, for exercising
+    retries and the circuit breaker.
+    """
+
+    def __init__(self, latency=0.0, fail_every=0, questions_per_call=5, latency_per_kchar=0.0):
+        self.latency = latency
+        self.latency_per_kchar = latency_per_kchar
+        self.fail_every = fail_every
+        self.questions_per_call = questions_per_call
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _start(self, contents):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        prompt = "\n".join(str(c) for c in contents)
+        return n, prompt, self.latency + self.latency_per_kchar * len(prompt) / 1000
+
+    def generate_content(self, model, contents, config=None):
+        n, prompt, delay = self._start(contents)
+        if delay:
+            time.sleep(delay)
+        return self._respond(n, prompt, config)
+
+    async def generate_content_async(self, model, contents, config=None):
+        """generate_content for the async server: the latency is awaited, not slept."""
+        n, prompt, delay = self._start(contents)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(n, prompt, config)
+
+    def _respond(self, n, prompt, config):
+        if self.fail_every and n % self.fail_every == 0:
+            raise RuntimeError(f"fake backend failure on call {n}")
+        config = config or {}
+        if config.get("response_schema") is not None:
+            return FakeResponse(json.dumps(self.questions(prompt)), prompt)
+        if config.get("response_mime_type") == "application/json":
+            return FakeResponse(json.dumps(self.weights(prompt)), prompt)
+        return FakeResponse("<ul><li>Review your weakest categories.</li><li>Retry missed questions.</li></ul>", prompt)
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Stream the same output as generate_content, one question at a time.
+
+        The configured latency is spread evenly across the questions, and
+        each question's JSON is split mid-object to exercise incremental
+        parsing. Only the last chunk's usage counts the whole call.
+        """
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        prompt = "\n".join(str(c) for c in contents)
+        if self.fail_every and n % self.fail_every == 0:
+            raise RuntimeError(f"fake backend failure on call {n}")
+        items = self.questions(prompt)
+        delay = (self.latency + self.latency_per_kchar * len(prompt) / 1000) / max(1, len(items))
+        yield FakeResponse("[")
+        sent = 1
+        for i, item in enumerate(items):
+            if delay:
+                time.sleep(delay)
+            text = json.dumps(item) + ("," if i < len(items) - 1 else "")
+            half = len(text) // 2
+            yield FakeResponse(text[:half])
+            yield FakeResponse(text[half:])
+            sent += len(text)
+        # Like the real stream, the last chunk reports the usage of the whole call
+        last = FakeResponse("]", prompt)
+        last.usage_metadata = FakeUsage(len(prompt) // 4, (sent + 1) // 4)
+        yield last
+
+    def questions(self, prompt):
+        # Batch prompts list "- N question(s) with category 'X' and difficulty_level 'Y'"
+        buckets = [(cat, diff, int(n)) for n, cat, diff in
+                   re.findall(r"- (\d+) question\(s\) with category '([^']+)' and difficulty_level '([^']+)'", prompt)]
+        if not buckets:
+            match = re.search(r"category '([^']+)' at the '([^']+)' level", prompt)
+            category, difficulty = match.groups() if match else ("general", "medium")
+            buckets = [(category, difficulty, self.questions_per_call)]
+        # Deterministic per prompt so identical requests give identical output
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return [
+            {
+                "answer": f"Option A{i}",
+                "prompt": f"[{seed}-{b}-{i}] Which statement about {category} is correct?",
+                "question_type": "multiple_choice",
+                "hint": f"Recall the definition of {category}.",
+                "explanation": f"Option A{i} follows from the definition of {category}.",
+                "choices": [f"Option A{i}", f"Option B{i}", f"Option C{i}", f"Option D{i}"],
+                "difficulty_level": difficulty,
+                "category": category,
+            }
+            for b, (category, difficulty, count) in enumerate(buckets)
+            for i in range(count)
+        ]
+
+    def weights(self, prompt):
+        categories = sorted(set(re.findall(r'"category": "([^"]+)"', prompt)))
+        return {cat: 1 / len(categories) for cat in categories} if categories else {}
@@ -0,0 +1,30 @@
+"""What the password-hash pool's processes run.
+
+Only werkzeug is imported here, not the rest of the app, so the fork server
+the pool processes come from starts no threads (the log listener's, for
+one) and never opens LOG_FILE.
+"""
+import functools
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+@functools.lru_cache(maxsize=None)
+def method_prefix(method):
+    # What werkzeug writes before the first "$" ("scrypt" -> "scrypt:32768:8:1"); costs one hash per process
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def verify_and_upgrade(stored, password, method):
+    """(matches, new hash or None); a new hash is made when `stored` used other parameters.
+
+    Runs in a pool process, so a login needing an upgrade still takes one round trip.
+    """
+    if not check_password_hash(stored, password):
+        return False, None
+    if stored.split("$", 1)[0] == method_prefix(method):
+        return True, None
+    return True, generate_password_hash(password, method=method)
@@ -0,0 +1,54 @@
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .logger import logger
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class JobQueue:
+    """Bounded background executor that runs at most one job per key.
+
+    Submitting a key that is already queued, running or finished returns the
+    existing job instead of starting another. Finished jobs are kept (up to
+    `keep` of them) so their results can be polled.
+    """
+
+    def __init__(self, name, workers, keep=1000):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()   # key -> {"status": ..., "result": ...}
+        self._keep = keep
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return dict(job)
+            job = self._jobs[key] = {"status": PENDING, "result": None}
+            while len(self._jobs) > self._keep:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest]["status"] in (PENDING, RUNNING):
+                    break
+                self._jobs.popitem(last=False)
+        # Run in the submitter's context so the job's log records keep its trace id
+        self._executor.submit(contextvars.copy_context().run, self._run, key, fn, args, kwargs)
+        return dict(job)
+
+    def _run(self, key, fn, args, kwargs):
+        with self._lock:
+            self._jobs[key]["status"] = RUNNING
+        try:
+            result = fn(*args, **kwargs)
+            status = DONE
+        except Exception as e:
+            logger.error("background job %s failed: %s", key, e)
+            result, status = None, FAILED
+        with self._lock:
+            self._jobs[key] = {"status": status, "result": result}
+
+    def status(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            return dict(job) if job is not None else None
@@ -1,6 +1,6 @@
 import json
-from google import genai
-from .config import PROJECT_ID, LOCATION, MODEL_NAME, NUM_QUESTIONS_PER_QUIZ
+from .config import NUM_QUESTIONS_PER_QUIZ
+from . import llm_gateway
 from .models import Question
 from .db import get_llm_input
 from .logger import logger
@@ -34,25 +34,21 @@ def generate_questions(text):
         "Every combination of category and difficulty_level must be present once."
     )
     user_prompt = f"generate {NUM_QUESTIONS_PER_QUIZ} quiz questions using this content: {text}"
-    client = genai.Client(vertexai=True, project="uday-452605", location="us-central1")
-    response = client.models.generate_content(
-                                          model=MODEL_NAME,
-                                          contents=[system_prompt, user_prompt],
+    try:
+        questions = llm_gateway.generate(
+                                          [system_prompt, user_prompt],
                                           config={
                                           "response_mime_type":"application/json",
                                           "response_schema":list[Question],}
                                           )
-    try:
-        questions = response.candidates[0].content.parts[0].text
         questions = json.loads(questions)
         logger.info("end generate_questions")        
         return questions
     except:
         return []
 
-def generate_questions_for(text, difficulty, category):
-    logger.info("start generate_questions_for")
-    system_prompt = system_prompt = (
+def _questions_for_prompts(text, difficulty, category):
+    system_prompt = (
         "You are an expert teacher creating multiple-choice quiz questions **strictly from the provided textbook chapter**.\n"
         "Your task is to generate questions that assess conceptual understanding based only on the given chapter content. External facts may be used only if they directly support the core syllabus concepts.\n\n"
 
@@ -73,34 +69,128 @@ def generate_questions_for(text, difficulty, category):
         "- `category`: Must be '{category}'.\n\n"
 
         "Only return a JSON array of such question objects—no extra explanation or commentary."
-    )
+    ).format(category=category, difficulty_level=difficulty)
     user_prompt = (
         f"Generate 5 quiz questions using this chapter content: '''{text}'''."
-        " Only create questions for the category '{category}' at the '{difficulty_level}' level."
+        f" Only create questions for the category '{category}' at the '{difficulty}' level."
     )
-    client = genai.Client(vertexai=True, project="uday-452605", location="us-central1")
-    response = client.models.generate_content(
-                                          model=MODEL_NAME,
-                                          contents=[system_prompt, user_prompt],
+    return system_prompt, user_prompt
+
+def generate_questions_for(text, difficulty, category, use_cache=False):
+    # Refills need fresh questions; a cached response would re-insert ones already in the bank
+    logger.info("start generate_questions_for")
+    system_prompt, user_prompt = _questions_for_prompts(text, difficulty, category)
+    try:
+        questions = llm_gateway.generate(
+                                          [system_prompt, user_prompt],
                                           config={
                                           "response_mime_type":"application/json",
-                                          "response_schema":list[Question],}
+                                          "response_schema":list[Question],},
+                                          cache=use_cache
                                           )
-    try:
-        questions = response.candidates[0].content.parts[0].text
         questions = json.loads(questions)
         logger.info("end generate_questions")        
         return questions
     except:
         return []
   
+def iter_array_objects(chunks):
+    """Yield each top-level object of a streamed JSON array as soon as it closes."""
+    buf = []
+    depth = 0
+    in_string = escaped = False
+    for chunk in chunks:
+        for ch in chunk:
+            if depth >= 1:
+                buf.append(ch)
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "[{":
+                depth += 1
+                if depth == 2:
+                    buf = [ch]
+            elif ch in "]}":
+                depth -= 1
+                if depth == 1 and ch == "}":
+                    yield json.loads("".join(buf))
+                    buf = []
+
+def stream_questions_for(text, difficulty, category):
+    """Like generate_questions_for, but yields each question as soon as the model finishes it."""
+    logger.info("start stream_questions_for")
+    system_prompt, user_prompt = _questions_for_prompts(text, difficulty, category)
+    try:
+        chunks = llm_gateway.generate_stream(
+                                          [system_prompt, user_prompt],
+                                          config={
+                                          "response_mime_type":"application/json",
+                                          "response_schema":list[Question],}
+                                          )
+        yield from iter_array_objects(chunks)
+    except Exception as e:
+        logger.error("streamed question generation failed: %s", e)
+
+def generate_questions_batch(text, buckets, use_cache=False):
+    """One structured-output call covering several (category, difficulty, count) buckets."""
+    logger.info("start generate_questions_batch")
+    bucket_lines = "\n".join(
+        f"- {count} question(s) with category '{category}' and difficulty_level '{difficulty}'"
+        for category, difficulty, count in buckets
+    )
+    system_prompt = (
+        "You are an expert teacher creating multiple-choice quiz questions **strictly from the provided textbook chapter**.\n"
+        "Your task is to generate questions that assess conceptual understanding based only on the given chapter content. External facts may be used only if they directly support the core syllabus concepts.\n\n"
+
+        "Instructions:\n"
+        "- Create exactly the questions requested below, no more and no fewer, for each (category, difficulty_level) pair.\n"
+        "- Copy `category` and `difficulty_level` exactly as written in the request.\n"
+        "- Use only content clearly aligned with the textbook chapter and avoid inventing topics outside it.\n\n"
+
+        "For each question, follow this exact schema:\n"
+        "- `answer`: The correct answer (must match one of the choices).\n"
+        "- `prompt`: A clear, direct, syllabus-aligned question.\n"
+        "- `question_type`: Always 'multiple_choice'.\n"
+        "- `hint`: A concise tip that can help the student.\n"
+        "- `explanation`: Why the correct answer is right.\n"
+        "- `choices`: Exactly 4 options, including the correct answer and three plausible distractors.\n"
+        "- `difficulty_level`: One of: 'easy', 'medium', 'hard'.\n"
+        "- `category`: The requested category.\n\n"
+
+        "Only return a JSON array of such question objects—no extra explanation or commentary."
+    )
+    user_prompt = (
+        f"Using this chapter content: '''{text}'''\n"
+        f"Generate:\n{bucket_lines}"
+    )
+    try:
+        questions = llm_gateway.generate(
+                                          [system_prompt, user_prompt],
+                                          config={
+                                          "response_mime_type":"application/json",
+                                          "response_schema":list[Question],},
+                                          cache=use_cache
+                                          )
+        questions = json.loads(questions)
+        logger.info("end generate_questions_batch")
+        return questions
+    except Exception as e:
+        logger.error("batch question generation failed: %s", e)
+        return []
+
 def get_llm_weights(user_id):
     logger.info("Enter get_llm_weights")
     
     input_data = get_llm_input(user_id)
     
     if not input_data["stats"]:
-        print("No data available for LLM weights calculation.")
+        logger.debug("No data available for LLM weights calculation.")
         return {}
     
     prompt = f"""
@@ -131,20 +221,18 @@ def get_llm_weights(user_id):
         """
 
     try:
-      #   Replace with your actual LLM client call
-        client = genai.Client(vertexai=True, project="uday-452605", location="us-central1")
-        response = client.models.generate_content(
-            model=MODEL_NAME, contents=[prompt], 
+        response = llm_gateway.generate(
+            [prompt], 
             config={"response_mime_type": "application/json"}
         )
-        logger.info("llm response from llm.py", response)
-        return json.loads(response.text)
+        logger.debug("llm response from llm.py: %s", response)
+        return json.loads(response)
         
     except json.JSONDecodeError as e:
-        print("Error decoding JSON from LLM response:", e)
+        logger.error("Error decoding JSON from LLM response: %s", e)
         return {}
     except Exception as e:
-        print("Error in LLM weights generation:", e)
+        logger.error("Error in LLM weights generation: %s", e)
         return {}
   
 def generate_study_plan(category_stats, difficulty_stats, score_percent, total_questions):
@@ -164,10 +252,7 @@ def generate_study_plan(category_stats, difficulty_stats, score_percent, total_q
     """
 
     try:
-        client = genai.Client(vertexai=True, project="uday-452605", location="us-central1")
-        response = response = client.models.generate_content(model=MODEL_NAME,
-                                                             contents=[prompt])
-        return response.text
+        return llm_gateway.generate([prompt])
     except Exception as e:
-        print(f"Error generating study plan: {e}")
+        logger.error("Error generating study plan: %s", e)
         return "<ul><li>Focus on weak areas and practice more.</li><li>Review explanations from your answers.</li></ul>"
\ No newline at end of file
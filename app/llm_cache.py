@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+import time
+from pydantic import TypeAdapter
+from .config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_S
+from .connection import execute, fetchone, transaction
+from .metrics import CACHE_LOOKUPS
+
+# A hit only rewrites last_used when it is older than this, to keep hits read-only
+TOUCH_INTERVAL_S = 300
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_inserts_since_trim = 0
+
+
+def _normalise_text(text):
+    return "\n".join(" ".join(line.split()) for line in str(text).strip().splitlines())
+
+
+def _normalise_config(config):
+    config = dict(config or {})
+    schema = config.get("response_schema")
+    if schema is not None and not isinstance(schema, dict):
+        config["response_schema"] = TypeAdapter(schema).json_schema()
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+def cache_key(model, contents, config):
+    """Hash of model, every prompt part (whitespace-normalised) and the JSON schema."""
+    h = hashlib.sha256()
+    for part in (model, *(_normalise_text(c) for c in contents), _normalise_config(config)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _bump(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def get(key):
+    if not LLM_CACHE_ENABLED:
+        return None
+    now = time.time()
+    row = fetchone("SELECT response, last_used FROM llm_cache WHERE key = ? AND created_at >= ?",
+                   (key, now - LLM_CACHE_TTL_S))
+    if row is None:
+        _bump("misses")
+        CACHE_LOOKUPS.inc(cache="llm_response", result="miss")
+        return None
+    _bump("hits")
+    CACHE_LOOKUPS.inc(cache="llm_response", result="hit")
+    if now - row[1] > TOUCH_INTERVAL_S:
+        with transaction():
+            execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+    return row[0]
+
+
+def put(key, response):
+    global _inserts_since_trim
+    if not LLM_CACHE_ENABLED:
+        return
+    now = time.time()
+    with transaction():
+        execute('''
+            INSERT INTO llm_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET response = excluded.response,
+                created_at = excluded.created_at, last_used = excluded.last_used
+        ''', (key, response, now, now))
+    _bump("stores")
+    with _lock:
+        _inserts_since_trim += 1
+        due = _inserts_since_trim >= max(1, LLM_CACHE_MAX_ENTRIES // 10)
+        if due:
+            _inserts_since_trim = 0
+    if due:
+        trim()
+
+
+def trim():
+    """Drop expired entries, then least recently used ones beyond the size bound."""
+    with transaction():
+        expired = execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - LLM_CACHE_TTL_S,)).rowcount
+        overflow = execute('''
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (LLM_CACHE_MAX_ENTRIES,)).rowcount
+    _bump("evictions", expired + overflow)
+
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+    return stats
@@ -0,0 +1,346 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .config import (PROJECT_ID, LOCATION, MODEL_NAME, LLM_BACKEND, LLM_FAKE_LATENCY_S,
+                     LLM_TIMEOUT_S, LLM_MAX_RETRIES, LLM_MAX_CONCURRENCY,
+                     LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN_S)
+from . import llm_cache
+from .logger import logger
+from .metrics import Counter, Gauge, Histogram, add_request_time
+
+# Backoff before retry n is uniform in [0, min(cap, base * 2**n)] ("full jitter")
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8.0
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class CircuitOpen(LLMError):
+    pass
+
+
+class GenaiBackend:
+    """The real Gemini client, built once and shared by every call."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    from google.genai import types
+                    self._client = genai.Client(
+                        vertexai=True,
+                        project=PROJECT_ID or "uday-452605",
+                        location=LOCATION or "us-central1",
+                        http_options=types.HttpOptions(timeout=int(LLM_TIMEOUT_S * 1000)),
+                    )
+        return self._client
+
+    def generate_content(self, model, contents, config=None):
+        return self.client().models.generate_content(model=model, contents=contents, config=config)
+
+    def generate_content_stream(self, model, contents, config=None):
+        return self.client().models.generate_content_stream(model=model, contents=contents, config=config)
+
+    async def generate_content_async(self, model, contents, config=None):
+        return await self.client().aio.models.generate_content(model=model, contents=contents, config=config)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial call through after `cooldown`."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """End a call without an outcome; a half-open trial slot goes to the next call."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def _default_backend():
+    if LLM_BACKEND == "fake":
+        from .fake_llm import FakeBackend
+        return FakeBackend(latency=LLM_FAKE_LATENCY_S)
+    return GenaiBackend()
+
+
+_backend = _default_backend()
+_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN_S)
+_calls = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+_lock = threading.Lock()
+_inflight = {}   # request key -> Future shared by identical concurrent callers
+_loop = None     # event loop of the async server; upstream calls run on it when set
+_slots = None    # asyncio.Semaphore bounding those calls to LLM_MAX_CONCURRENCY
+_stats = {"calls": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0,
+          "failures": 0, "timeouts": 0, "short_circuited": 0}
+
+LLM_LATENCY = Histogram("quiz_llm_request_seconds", "Upstream LLM call latency", ["mode", "outcome"])
+LLM_TOKENS = Counter("quiz_llm_tokens_total", "LLM tokens reported by the backend", ["direction"])
+LLM_FAILURES = Counter("quiz_llm_failures_total", "Failed upstream LLM attempts", ["reason"])
+LLM_BREAKER_OPEN = Gauge("quiz_llm_breaker_open", "1 while the LLM circuit breaker is not closed",
+                         collect=lambda: {(): 0 if _breaker.state == "closed" else 1})
+
+
+def _record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_token_count", None) or 0, direction="prompt")
+    LLM_TOKENS.inc(getattr(usage, "candidates_token_count", None) or 0, direction="output")
+
+
+def set_backend(backend):
+    """Swap the upstream (e.g. for a local fake); returns the previous one."""
+    global _backend
+    previous, _backend = _backend, backend
+    _breaker.record_success()
+    return previous
+
+
+def get_backend():
+    return _backend
+
+
+def use_event_loop(loop):
+    """Run upstream calls as coroutines on `loop` (None: back to the thread pool).
+
+    Called by the async server, so in-flight calls cost no thread each.
+    """
+    global _loop, _slots
+    _loop, _slots = loop, asyncio.Semaphore(LLM_MAX_CONCURRENCY) if loop is not None else None
+
+
+async def _generate_async(backend, model, contents, config):
+    async with _slots:
+        return await backend.generate_content_async(model, contents, config)
+
+
+def _submit(model, contents, config):
+    """Start one upstream call; a concurrent.futures Future either way."""
+    backend = _backend
+    if _loop is not None and hasattr(backend, "generate_content_async"):
+        return asyncio.run_coroutine_threadsafe(_generate_async(backend, model, contents, config), _loop)
+    return _calls.submit(backend.generate_content, model, contents, config)
+
+
+def _bump(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def generate(contents, config=None, model=None, timeout=None, retries=None, cache=True):
+    """Call the model and return the response text.
+
+    Responses are served from and stored in the persistent response cache
+    unless `cache` is False. Identical concurrent requests share one
+    upstream call. Each attempt is bounded by the remaining deadline and
+    failures are retried with jittered backoff. While the circuit breaker is
+    open this raises CircuitOpen at once so callers can fall back locally.
+    """
+    model = model or MODEL_NAME
+    key = llm_cache.cache_key(model, contents, config)
+    deadline = time.monotonic() + (LLM_TIMEOUT_S if timeout is None else timeout)
+    _bump("calls")
+    if cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    with _lock:
+        shared = _inflight.get(key)
+        leader = shared is None
+        if leader:
+            shared = _inflight[key] = Future()
+    if not leader:
+        _bump("coalesced")
+        try:
+            return shared.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            raise LLMTimeout("timed out waiting for a coalesced LLM call")
+
+    try:
+        text = _call_with_retries(model, contents, config, deadline,
+                                  LLM_MAX_RETRIES if retries is None else retries)
+        if cache:
+            llm_cache.put(key, text)
+        shared.set_result(text)
+        return text
+    except BaseException as e:
+        shared.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def _observe_call(mode, outcome, started):
+    elapsed = time.perf_counter() - started
+    LLM_LATENCY.observe(elapsed, mode=mode, outcome=outcome)
+    add_request_time("llm", elapsed)
+
+
+def _call_with_retries(model, contents, config, deadline, retries):
+    last_error = None
+    for attempt in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not _breaker.allow():
+            _bump("short_circuited")
+            raise CircuitOpen("LLM backend is failing; circuit breaker is open")
+        _bump("upstream_calls")
+        started = time.perf_counter()
+        future = _submit(model, contents, config)
+        try:
+            response = future.result(timeout=remaining)
+            text = response.text
+            if text is None:
+                raise LLMError("empty LLM response")
+            _breaker.record_success()
+            _observe_call("generate", "ok", started)
+            _record_usage(response)
+            return text
+        except FutureTimeout:
+            # Stops a coroutine call; a call already running on a thread finishes regardless
+            future.cancel()
+            _bump("timeouts")
+            last_error = LLMTimeout(f"LLM call exceeded its {remaining:.1f}s deadline")
+            _observe_call("generate", "timeout", started)
+            LLM_FAILURES.inc(reason="timeout")
+        except Exception as e:
+            last_error = e
+            _observe_call("generate", "error", started)
+            LLM_FAILURES.inc(reason=type(e).__name__)
+        _bump("failures")
+        _breaker.record_failure()
+        logger.warning("LLM attempt %d failed: %s", attempt + 1, last_error)
+        if attempt < retries:
+            _bump("retries")
+            pause = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+            time.sleep(max(0.0, min(pause, deadline - time.monotonic())))
+    raise last_error or LLMTimeout("LLM deadline exceeded")
+
+
+def generate_stream(contents, config=None, model=None, timeout=None):
+    """Yield response text chunks as the model produces them.
+
+    Streams are neither cached, coalesced nor retried (output may already
+    have been consumed), but they honour the deadline and the circuit
+    breaker like generate(). A consumer that stops early ends the upstream
+    read at its next chunk, and the call counts as neither success nor
+    failure.
+    """
+    model = model or MODEL_NAME
+    deadline = time.monotonic() + (LLM_TIMEOUT_S if timeout is None else timeout)
+    _bump("calls")
+    if not _breaker.allow():
+        _bump("short_circuited")
+        raise CircuitOpen("LLM backend is failing; circuit breaker is open")
+    _bump("upstream_calls")
+    chunks = queue.Queue()
+    stop = threading.Event()
+    backend = _backend
+
+    def pump():
+        last = None
+        try:
+            for chunk in backend.generate_content_stream(model, contents, config):
+                if stop.is_set():
+                    return
+                if chunk.text:
+                    chunks.put(("chunk", chunk.text))
+                last = chunk
+            # The final chunk's usage metadata covers the whole call
+            chunks.put(("end", last))
+        except Exception as e:
+            chunks.put(("error", e))
+
+    started = time.perf_counter()
+    _calls.submit(pump)
+    finished = False
+    try:
+        while True:
+            try:
+                kind, value = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                _bump("timeouts")
+                kind, value = "error", LLMTimeout("LLM stream exceeded its deadline")
+            if kind == "chunk":
+                yield value
+            elif kind == "end":
+                finished = True
+                _breaker.record_success()
+                _observe_call("stream", "ok", started)
+                _record_usage(value)
+                return
+            else:
+                finished = True
+                _bump("failures")
+                _breaker.record_failure()
+                _observe_call("stream", "error", started)
+                LLM_FAILURES.inc(reason=type(value).__name__)
+                raise value
+    finally:
+        stop.set()
+        if not finished:
+            # Closed early or the consumer raised; were this the half-open trial, the breaker would stay shut
+            _breaker.release()
+            _observe_call("stream", "abandoned", started)
+
+
+def gateway_status():
+    with _lock:
+        stats = dict(_stats)
+    stats["breaker"] = _breaker.state
+    stats["async_upstream"] = _loop is not None
+    stats["consecutive_failures"] = _breaker.failures
+    stats["cache"] = llm_cache.cache_stats()
+    return stats
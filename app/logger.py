@@ -1,13 +1,204 @@
+"""Application logging: a queue on the calling thread, I/O on a listener thread.
+
+Callers only format the message and put the record on a queue. A listener
+thread writes it to the console and, as one JSON object per line, to a
+size-rotated LOG_FILE. Only the process that opened the file rotates it,
+checking its size now and then as well as on its own writes; forked workers
+(gunicorn's) only append, and reopen the file once it has been rotated
+away. Records carry the trace id of the request that logged them.
+LOG_LEVELS sets levels per module (e.g. "replenish=WARNING"). Events
+listed in LOG_SAMPLE are kept at that rate.
+"""
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from .config import (LOG_LEVEL, LOG_LEVELS, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_SAMPLE,
+                     LOG_SLOW_REQUEST_MS)
+
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+# How often the process that owns LOG_FILE checks whether other processes' writes filled it
+ROTATE_CHECK_S = 30
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id"}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "module": record.module,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Per-module levels, sampling and the trace id; runs on the calling thread."""
+
+    def __init__(self, default_level, module_levels, sample_rates):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = module_levels
+        self.sample_rates = sample_rates
+
+    def filter(self, record):
+        if record.levelno < self.module_levels.get(record.module, self.default_level):
+            return False
+        rate = self.sample_rates.get(getattr(record, "event", None))
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        record.trace_id = trace_id.get()
+        return True
+
+
+def _level(name):
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {name!r}")
+    return level
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        module, _, level = item.partition("=")
+        levels[module.strip()] = _level(level)
+    return levels
+
+
+def _parse_rates(spec):
+    return {name.strip(): float(rate) for name, _, rate in
+            (item.partition("=") for item in spec.split(",") if "=" in item)}
+
+
+def _watch_size(handler):
+    while True:
+        time.sleep(ROTATE_CHECK_S)
+        try:
+            if os.path.getsize(handler.baseFilename) >= handler.maxBytes:
+                handler.acquire()
+                try:
+                    handler.doRollover()
+                finally:
+                    handler.release()
+        except OSError:
+            pass
+
+
+def _handlers():
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    handlers = [console]
+    if LOG_FILE:
+        rotating = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        rotating.setFormatter(JSONFormatter())
+        handlers.append(rotating)
+        if LOG_MAX_BYTES > 0:
+            threading.Thread(target=_watch_size, args=(rotating,), daemon=True, name="log-rotate").start()
+    return handlers
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only the message is rendered on the calling thread; structured fields
+        # are left for the JSON formatter. This is the logger's only handler, so
+        # the record can be changed in place rather than copied.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_default_level = _level(LOG_LEVEL)
+_module_levels = _parse_levels(LOG_LEVELS)
+_handler = _QueueHandler(queue.SimpleQueue())
+_handler.addFilter(ContextFilter(_default_level, _module_levels, _parse_rates(LOG_SAMPLE)))
+_listener = logging.handlers.QueueListener(_handler.queue, *_handlers(), respect_handler_level=True)
+_listener.start()
+
+logger = logging.getLogger("quizz_app_logger")  # Give your app a name
+logger.setLevel(min([_default_level, *_module_levels.values()]))
+logger.addHandler(_handler)
+logger.propagate = False
+
+
+def _child_handler(handler):
+    """Size-based rotation from several processes loses lines; children only append.
+
+    A WatchedFileHandler reopens the file once whoever rotates it has moved it away.
+    """
+    if not isinstance(handler, logging.handlers.RotatingFileHandler):
+        return handler
+    watched = logging.handlers.WatchedFileHandler(handler.baseFilename, encoding="utf-8")
+    watched.setFormatter(handler.formatter)
+    return watched
+
+
+def _restart_listener():
+    """A forked child has the queue but not the listener thread; give it both afresh."""
+    global _listener
+    _handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_handler.queue, *map(_child_handler, _listener.handlers),
+                                               respect_handler_level=True)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+# Drain what is queued at exit
+atexit.register(lambda: _listener.stop())
+
+
+def event(name, level=logging.INFO, **fields):
+    """Log a structured event; `fields` become top-level keys of the JSON record."""
+    logger.log(level, name, extra={"event": name, **fields}, stacklevel=2)
+
+
+def init_app(app):
+    """Give every request a trace id (X-Request-ID if the client sent one) and an access event."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        g._trace_token = trace_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16])
+        g._trace_start = time.perf_counter()
+
+    @app.after_request
+    def _access_event(response):
+        start = g.pop("_trace_start", None)
+        if start is not None:
+            duration_ms = (time.perf_counter() - start) * 1000
+            # Errors and slow requests are always kept, whatever the sample rate
+            level = logging.WARNING if response.status_code >= 500 or duration_ms >= LOG_SLOW_REQUEST_MS else logging.INFO
+            event("request", level, method=request.method, path=request.path, status=response.status_code,
+                  duration_ms=round(duration_ms, 2))
+        response.headers["X-Request-ID"] = trace_id.get() or ""
+        return response
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger("quizz_app_logger")  # Give your app a name
\ No newline at end of file
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop("_trace_token", None)
+        if token is not None:
+            trace_id.reset(token)
@@ -0,0 +1,170 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+from .config import METRICS_TIMING_HEADERS
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_request_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time by `collect`.
+
+    `collect` returns {label-values tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.collect is not None:
+            items = sorted(((tuple(map(str, k)), v) for k, v in self.collect().items()))
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                                for k, v in items if v is not None]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Per-request timing breakdown (Server-Timing header) ---
+
+def add_request_time(component, seconds):
+    timings = getattr(_request_local, "timings", None)
+    if timings is not None:
+        timings[component] = timings.get(component, 0.0) + seconds
+
+
+HTTP_LATENCY = Histogram("quiz_http_request_seconds", "Request latency by route", ["method", "route", "status"])
+CACHE_LOOKUPS = Counter("quiz_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+def _hit_ratios():
+    with CACHE_LOOKUPS._lock:
+        values = dict(CACHE_LOOKUPS._values)
+    ratios = {}
+    for cache in {cache for cache, _ in values}:
+        hits, misses = values.get((cache, "hit"), 0), values.get((cache, "miss"), 0)
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else None
+    return ratios
+
+
+CACHE_HIT_RATIO = Gauge("quiz_cache_hit_ratio", "Share of cache lookups that hit", ["cache"], collect=_hit_ratios)
+
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        _request_local.timings = {}
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        HTTP_LATENCY.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        timings = getattr(_request_local, "timings", None) or {}
+        _request_local.timings = None
+        if METRICS_TIMING_HEADERS:
+            parts = [f"{name};dur={secs * 1000:.2f}" for name, secs in timings.items()]
+            parts.append(f"total;dur={elapsed * 1000:.2f}")
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
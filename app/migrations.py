@@ -0,0 +1,230 @@
+import json
+from .connection import execute, executemany, fetchone, transaction
+from .logger import logger
+from .models import dump_choices
+
+
+def _add_column_if_missing(table, column, decl):
+    columns = [row[1] for row in execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _baseline():
+    """The schema as it stood before versioning; a no-op on existing databases."""
+    execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL
+        )
+    ''')
+    execute('''
+        CREATE TABLE IF NOT EXISTS user_category_stats (
+            user_id INTEGER,
+            category TEXT,
+            correct INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            last_study_plan TEXT,
+            PRIMARY KEY (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+    execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            answer TEXT,
+            prompt TEXT,
+            question_type TEXT,
+            hint TEXT,
+            explanation TEXT,
+            choices TEXT,
+            difficulty_level TEXT,
+            category TEXT
+        )
+    ''')
+    execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    ''')
+    execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    _add_column_if_missing("user_category_stats", "updated_at", "REAL")
+
+
+def _indexes():
+    # Bucket lookups and per-bucket counts are answered from the index alone
+    execute("CREATE INDEX IF NOT EXISTS idx_questions_difficulty_category ON questions (difficulty_level, category)")
+    execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+    execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+    execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+
+def _study_plans():
+    """One row per generated plan instead of a copy in every category row."""
+    execute('''
+        CREATE TABLE IF NOT EXISTS study_plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+    execute("CREATE INDEX IF NOT EXISTS idx_study_plans_user ON study_plans (user_id, id)")
+    execute('''
+        INSERT INTO study_plans (user_id, plan, created_at)
+        SELECT user_id, MAX(last_study_plan), COALESCE(MAX(updated_at), strftime('%s', 'now'))
+        FROM user_category_stats
+        WHERE last_study_plan IS NOT NULL AND last_study_plan != ''
+        GROUP BY user_id
+    ''')
+    execute("UPDATE user_category_stats SET last_study_plan = NULL WHERE last_study_plan IS NOT NULL")
+
+
+def _compact_choices():
+    """Rewrite choices as whitespace-free JSON with unescaped unicode."""
+    updates = []
+    for qid, choices in execute("SELECT id, choices FROM questions").fetchall():
+        try:
+            compact = dump_choices(json.loads(choices) if choices else [])
+        except ValueError:
+            continue
+        if compact != choices:
+            updates.append((compact, qid))
+    if updates:
+        executemany("UPDATE questions SET choices = ? WHERE id = ?", updates)
+
+
+def _question_signatures():
+    execute('''
+        CREATE TABLE IF NOT EXISTS question_signatures (
+            question_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    ''')
+
+
+def _corpus():
+    """Ingested documents and their pages; questions remember their source document."""
+    execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT UNIQUE NOT NULL,
+            course TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            page_count INTEGER NOT NULL,
+            ingested_at REAL NOT NULL
+        )
+    ''')
+    execute("CREATE INDEX IF NOT EXISTS idx_documents_course ON documents (course)")
+    execute('''
+        CREATE TABLE IF NOT EXISTS document_pages (
+            document_id INTEGER NOT NULL,
+            page_no INTEGER NOT NULL,
+            page_hash TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (document_id, page_no),
+            FOREIGN KEY (document_id) REFERENCES documents(id)
+        )
+    ''')
+    # NULL is the single chapter at PDF_PATH
+    _add_column_if_missing("questions", "document_id", "INTEGER")
+    execute("CREATE INDEX IF NOT EXISTS idx_questions_document ON questions (document_id, difficulty_level, category)")
+
+
+def _attempts():
+    """Append-only answer log plus per-question rollups fed from it."""
+    execute('''
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER,
+            quiz_id TEXT,
+            category TEXT,
+            difficulty_level TEXT,
+            correct INTEGER NOT NULL,
+            answered_at REAL NOT NULL
+        )
+    ''')
+    execute("CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts (user_id, answered_at)")
+    execute("CREATE INDEX IF NOT EXISTS idx_attempts_question ON attempts (question_id)")
+    execute('''
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            last_attempt_at REAL
+        )
+    ''')
+
+
+def _signature_seq():
+    """Insertion order of signatures, so workers can load the ones added for old questions."""
+    _add_column_if_missing("question_signatures", "seq", "INTEGER")
+    execute("UPDATE question_signatures SET seq = question_id WHERE seq IS NULL")
+    execute("CREATE INDEX IF NOT EXISTS idx_question_signatures_seq ON question_signatures (seq)")
+
+
+def _profile_version():
+    """Per-user counter bumped with every profile write; /profile ETags are built from it."""
+    _add_column_if_missing("users", "profile_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _study_plan_quiz():
+    """The quiz each plan was written for, so any worker can tell whether a quiz's plan is ready."""
+    _add_column_if_missing("study_plans", "quiz_id", "TEXT")
+    execute("CREATE INDEX IF NOT EXISTS idx_study_plans_quiz ON study_plans (user_id, quiz_id)")
+
+
+def _bank_version():
+    """A counter bumped whenever questions are deleted, so other processes know to reload."""
+    execute("CREATE TABLE IF NOT EXISTS bank_version (version INTEGER NOT NULL)")
+    execute("INSERT INTO bank_version (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM bank_version)")
+
+
+# Append only; a database at version N has run the first N entries
+MIGRATIONS = [
+    ("baseline", _baseline),
+    ("indexes", _indexes),
+    ("study_plans", _study_plans),
+    ("compact_choices", _compact_choices),
+    ("question_signatures", _question_signatures),
+    ("corpus", _corpus),
+    ("attempts", _attempts),
+    ("signature_seq", _signature_seq),
+    ("profile_version", _profile_version),
+    ("study_plan_quiz", _study_plan_quiz),
+    ("bank_version", _bank_version),
+]
+
+
+def schema_version():
+    return fetchone("PRAGMA user_version")[0]
+
+
+def migrate(target=None):
+    """Bring the database up to `target` (default: latest), one transaction per step.
+
+    The version is re-read under the write lock, so several workers starting
+    at once run each migration exactly once.
+    """
+    target = len(MIGRATIONS) if target is None else target
+    while True:
+        with transaction():
+            version = schema_version()
+            if version >= target:
+                return version
+            name, step = MIGRATIONS[version]
+            step()
+            execute(f"PRAGMA user_version = {version + 1}")
+        logger.info("applied migration %d (%s)", version + 1, name)
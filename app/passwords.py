@@ -0,0 +1,180 @@
+"""Password hashing off the request thread, with backpressure and login throttling.
+
+Key derivation runs on a bounded process pool. Once PASSWORD_HASH_MAX_PENDING
+hashes are queued, new ones fail fast with Busy rather than queueing behind
+a login surge. Usernames with too many recent failures are refused before
+any hashing is done, and a username's checks run one at a time. Stored
+hashes made with other parameters than PASSWORD_HASH_METHOD are re-hashed
+on the next successful login. Throttling state and the pool are per
+process; by default each gunicorn worker gets its share of the CPUs.
+"""
+import hashlib
+import hmac
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from .config import (PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING,
+                     PASSWORD_HASH_TIMEOUT_S, LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW_S)
+from .hashing import hash_password, verify_and_upgrade
+from .logger import logger
+from .metrics import Counter, Gauge, Histogram
+
+
+class Busy(Exception):
+    """Too many hashes queued, or one took too long; retry shortly."""
+
+
+class Throttled(Exception):
+    """Too many failed logins for this username; `retry_after` is seconds until the window resets."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_pending = 0
+_failures = {}      # username -> (failed attempts, time of the first in this window)
+_checking = {}      # username -> (sha256 of the password, Future of the check in flight)
+_FAILURES_PRUNE_AT = 10000
+
+HASH_SECONDS = Histogram("quiz_password_hash_seconds", "Password hashing time, queueing included", ["op"])
+HASH_REJECTED = Counter("quiz_password_hash_rejected_total", "Login and register attempts refused without hashing",
+                        ["reason"])
+HASH_SHARED = Counter("quiz_password_hash_shared_total", "Repeated logins answered by the identical check in flight")
+HASH_UPGRADED = Counter("quiz_password_hash_upgraded_total", "Stored hashes re-hashed with the current parameters")
+HASH_PENDING = Gauge("quiz_password_hash_pending", "Hashes queued or running", collect=lambda: {(): _pending})
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # Not fork: this process runs threads (the log listener, the background
+        # writers, request threads), and a child forked while one of them holds
+        # a lock can hang on it. The fork server starts from a fresh interpreter
+        # and preloads only app.hashing. Pool processes re-import the entry
+        # script, so it must only build the app under `if __name__ == "__main__"`.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["app.hashing"])
+        _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=context)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _release(_future):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _run(op, fn, *args):
+    """`fn(*args)` on the pool (on this thread when PASSWORD_HASH_WORKERS is 0); Busy when saturated.
+
+    A queued hash holds its slot until it has run, even when its caller
+    gave up waiting, so PASSWORD_HASH_MAX_PENDING bounds the pool's backlog.
+    """
+    global _pending, _pool
+    start = time.perf_counter()
+    if PASSWORD_HASH_WORKERS <= 0:
+        try:
+            return fn(*args)
+        finally:
+            HASH_SECONDS.observe(time.perf_counter() - start, op=op)
+    with _lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            HASH_REJECTED.inc(reason="busy")
+            raise Busy("password hashing is saturated")
+        _pending += 1
+        pool = _get_pool()
+    try:
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            _release(None)
+            raise
+        future.add_done_callback(_release)
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT_S)
+    except FutureTimeout:
+        HASH_REJECTED.inc(reason="timeout")
+        raise Busy("password hashing timed out")
+    except BrokenProcessPool:
+        logger.error("password hash pool broke; starting a new one")
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        raise Busy("password hashing pool restarted")
+    finally:
+        HASH_SECONDS.observe(time.perf_counter() - start, op=op)
+
+
+def make_hash(password):
+    """A hash of `password` with the configured parameters, for a new account."""
+    return _run("generate", hash_password, password, PASSWORD_HASH_METHOD)
+
+
+def check_login(username, password, stored):
+    """(matches, upgraded hash or None) for a login attempt.
+
+    `stored` is None for an unknown username; that counts as a failure
+    without hashing anything. Raises Throttled or Busy without hashing.
+    Checks for one username run one at a time: a repeat of the attempt in
+    flight (a double-submitted form) waits for it and shares its outcome,
+    counted as one attempt, while a different password waits its turn.
+    """
+    digest = hashlib.sha256(password.encode("utf-8")).digest()
+    while True:
+        now = time.time()
+        with _lock:
+            count, since = _failures.get(username, (0, now))
+            if now - since > LOGIN_FAILURE_WINDOW_S:
+                count, since = 0, now
+            if count >= LOGIN_MAX_FAILURES:
+                HASH_REJECTED.inc(reason="failures")
+                raise Throttled("too many failed attempts, try again later",
+                                max(1, math.ceil(since + LOGIN_FAILURE_WINDOW_S - now)))
+            inflight = _checking.get(username)
+            if inflight is None:
+                outcome = Future()
+                _checking[username] = (digest, outcome)
+                break
+        other_digest, other = inflight
+        try:
+            ok = other.result(timeout=PASSWORD_HASH_TIMEOUT_S)
+        except FutureTimeout:
+            raise Busy("password hashing timed out")
+        except Exception:
+            ok = None   # the attempt in flight failed (e.g. Busy); make our own
+        if ok is not None and hmac.compare_digest(digest, other_digest):
+            HASH_SHARED.inc()
+            # The first attempt already wrote any upgraded hash
+            return ok, None
+    try:
+        ok, upgraded = (False, None) if stored is None else \
+            _run("verify", verify_and_upgrade, stored, password, PASSWORD_HASH_METHOD)
+    except BaseException as e:
+        with _lock:
+            _checking.pop(username, None)
+        outcome.set_exception(e)
+        raise
+    with _lock:
+        # Recorded before the next attempt for this username is let through
+        if ok:
+            _failures.pop(username, None)
+        else:
+            _failures[username] = (count + 1, since)
+            if len(_failures) > _FAILURES_PRUNE_AT:
+                # Guessed usernames would otherwise accumulate forever
+                for name, (_, first) in list(_failures.items()):
+                    if now - first > LOGIN_FAILURE_WINDOW_S:
+                        del _failures[name]
+        _checking.pop(username, None)
+    outcome.set_result(ok)
+    if upgraded:
+        HASH_UPGRADED.inc()
+    return ok, upgraded
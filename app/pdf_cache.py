@@ -0,0 +1,109 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from .config import PDF_CACHE_DIR
+from .metrics import CACHE_LOOKUPS
+
+# Bump when the extraction logic changes so stale caches are ignored
+PARSER_VERSION = 1
+
+# File layout: header, (page_count + 1) little-endian uint64 byte offsets
+# into the UTF-8 blob, then the blob itself. Page i is blob[off[i]:off[i+1]].
+MAGIC = b"QZPC"
+HEADER = struct.Struct("<4sII")   # magic, parser version, page count
+OFFSET = struct.Struct("<Q")
+
+_lock = threading.Lock()
+_hashes = {}    # path -> ((mtime_ns, size), sha256)
+_loaded = {}    # cache key -> ParsedDocument
+
+
+class ParsedDocument:
+    """Per-page text of a PDF backed by a memory-mapped cache file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != PARSER_VERSION:
+            raise ValueError(f"Not a parsed-document cache: {path}")
+        self.page_count = count
+        base = HEADER.size
+        self.offsets = [OFFSET.unpack_from(self._mm, base + i * OFFSET.size)[0] for i in range(count + 1)]
+        self._blob_start = base + (count + 1) * OFFSET.size
+        self._text = None
+
+    def page(self, i):
+        start = self._blob_start + self.offsets[i]
+        end = self._blob_start + self.offsets[i + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def pages(self):
+        return [self.page(i) for i in range(self.page_count)]
+
+    def text(self):
+        if self._text is None:
+            self._text = self._mm[self._blob_start:].decode("utf-8")
+        return self._text
+
+
+def file_hash(path):
+    """sha256 of the file, recomputed only when its mtime or size changes."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _hashes.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    _hashes[path] = (stamp, digest)
+    return digest
+
+
+def cache_path(digest):
+    return os.path.join(PDF_CACHE_DIR, f"{digest}.v{PARSER_VERSION}.pages")
+
+
+def extract_pages(path):
+    import fitz     # slow to import and only needed on a cache miss
+    doc = fitz.open(path)
+    pages = [page.get_text() for page in doc]
+    doc.close()
+    return pages
+
+
+def write_cache(dest, pages):
+    blobs = [p.encode("utf-8") for p in pages]
+    offsets = [0]
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, PARSER_VERSION, len(pages)))
+        f.write(b"".join(OFFSET.pack(o) for o in offsets))
+        f.write(b"".join(blobs))
+    os.replace(tmp, dest)
+
+
+def load_document(path):
+    """Return the parsed document for a PDF, parsing it only on a cache miss."""
+    key = cache_path(file_hash(path))
+    doc = _loaded.get(key)
+    if doc is not None:
+        CACHE_LOOKUPS.inc(cache="parsed_pdf", result="hit")
+        return doc
+    with _lock:
+        doc = _loaded.get(key)
+        if doc is None:
+            if not os.path.exists(key):
+                CACHE_LOOKUPS.inc(cache="parsed_pdf", result="miss")
+                write_cache(key, extract_pages(path))
+            doc = ParsedDocument(key)
+            _loaded[key] = doc
+    return doc
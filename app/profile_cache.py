@@ -0,0 +1,64 @@
+"""Per-user cache of what /profile shows, versioned for conditional GETs.
+
+Each user row carries a profile_version that the transactions writing their
+stats or study plan bump, so every worker process sees the same version.
+The ETag is built from it and a fingerprint of the catalog counts the page
+shows, so an unchanged profile is answered with a 304 after one primary-key
+lookup. The rendered data itself is cached per process, keyed the same way.
+"""
+import hashlib
+import threading
+from . import catalog
+from .connection import execute, fetchone
+from .metrics import CACHE_LOOKUPS
+
+_lock = threading.Lock()
+_cache = {}                 # user_id -> (version, catalog generation, stats, latest plan)
+_catalog_tag = (None, "")   # (catalog generation, fingerprint of its category counts)
+
+
+def version(user_id):
+    row = fetchone("SELECT profile_version FROM users WHERE id = ?", (user_id,))
+    return row[0] if row else 0
+
+
+def _catalog_fingerprint():
+    # Generation counters are per process; the counts behind them are what the page shows
+    global _catalog_tag
+    generation = catalog.generation()
+    with _lock:
+        if _catalog_tag[0] == generation:
+            return _catalog_tag[1]
+    counts = sorted(catalog.category_counts().items())
+    fingerprint = hashlib.blake2b(repr(counts).encode("utf-8"), digest_size=6).hexdigest()
+    with _lock:
+        _catalog_tag = (generation, fingerprint)
+    return fingerprint
+
+
+def etag(user_id, profile_version, in_progress):
+    return f"{user_id}-{profile_version}-{_catalog_fingerprint()}-{int(bool(in_progress))}"
+
+
+def get_profile(user_id, profile_version):
+    """(stats, latest study plan) for a user, from cache when nothing changed."""
+    generation = catalog.generation()
+    with _lock:
+        cached = _cache.get(user_id)
+    if cached is not None and cached[:2] == (profile_version, generation):
+        CACHE_LOOKUPS.inc(cache="profile", result="hit")
+        return cached[2], cached[3]
+    CACHE_LOOKUPS.inc(cache="profile", result="miss")
+    from .db import get_latest_study_plan, get_user_stats
+    stats = get_user_stats(user_id)
+    plan = get_latest_study_plan(user_id)
+    with _lock:
+        # A write landing while loading leaves this keyed under the older
+        # version, which only costs the next request a miss
+        _cache[user_id] = (profile_version, generation, stats, plan)
+    return stats, plan
+
+
+def invalidate(user_id):
+    """Bump the user's profile version; call inside the transaction that changes their profile."""
+    execute("UPDATE users SET profile_version = profile_version + 1 WHERE id = ?", (user_id,))
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from array import array
+from .connection import fetchall, fetchone
+
+# Random probes before falling back to a linear scan of the bucket
+MAX_PROBES = 16
+# How often a loaded index checks for questions other processes added or deleted
+VERSION_CHECK_S = 5
+
+_lock = threading.Lock()
+_buckets = {}       # (difficulty, category) -> array of question ids, None = any
+_doc_buckets = {}   # (document_id, difficulty, category) -> array; document None = the chapter at PDF_PATH
+_max_id = 0
+_loaded = False
+_version = None     # bank_version the buckets were loaded under
+_checked_at = 0.0
+
+
+def _keys(difficulty, category):
+    return ((difficulty, category), (difficulty, None), (None, category), (None, None))
+
+
+def _append(buckets, key, question_id):
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = array("q")
+    bucket.append(question_id)
+
+
+def _add_locked(question_id, difficulty, category, document_id):
+    global _max_id
+    for key in _keys(difficulty, category):
+        _append(_buckets, key, question_id)
+        _append(_doc_buckets, (document_id, *key), question_id)
+    _max_id = max(_max_id, question_id)
+
+
+_ROWS_SQL = "SELECT id, difficulty_level, category, document_id FROM questions WHERE id > ?"
+
+
+def unseen_rows(rows, since):
+    """The (id, difficulty_level, category, document_id) rows above `since`, gaps included.
+
+    Post-commit adds can arrive out of order, so when `rows` do not carry on
+    directly from `since` the whole range is read back from the table rather
+    than letting the watermark jump over ids that were committed first.
+    Shared with catalog, which keeps the same kind of watermark.
+    """
+    fresh = sorted(row for row in rows if row[0] > since)
+    if fresh and fresh[-1][0] - since != len(fresh):
+        fresh = fetchall(_ROWS_SQL + " AND id <= ? ORDER BY id", (since, fresh[-1][0]))
+    return fresh
+
+
+def bank_version():
+    """Bumped by every deletion of questions; shared with catalog, which reloads on it too."""
+    return fetchone("SELECT version FROM bank_version")[0]
+
+
+def refresh():
+    """Pull rows inserted since the last load, including by other processes.
+
+    When another process has deleted questions since (bank_version moved),
+    the buckets are reloaded from scratch instead.
+    """
+    global _loaded, _max_id, _version, _checked_at
+    version = bank_version()
+    with _lock:
+        if version != _version:
+            _buckets.clear()
+            _doc_buckets.clear()
+            _max_id = 0
+            _version = version
+        since = _max_id
+        _checked_at = time.monotonic()
+    rows = fetchall(_ROWS_SQL + " ORDER BY id", (since,))
+    with _lock:
+        # Rows read before a reload began would be added to the emptied buckets
+        if _version == version:
+            for qid, diff, cat, doc in rows:
+                if qid > _max_id:
+                    _add_locked(qid, diff, cat, doc)
+        _loaded = True
+    return len(rows)
+
+
+def _ensure_fresh():
+    if not _loaded or time.monotonic() - _checked_at >= VERSION_CHECK_S:
+        refresh()
+
+
+def add(rows):
+    """Register freshly inserted (id, difficulty_level, category, document_id) rows."""
+    if not _loaded:
+        return
+    with _lock:
+        since, version = _max_id, _version
+    rows = unseen_rows(rows, since)
+    with _lock:
+        if _version == version:
+            for qid, diff, cat, doc in rows:
+                if qid > _max_id:
+                    _add_locked(qid, diff, cat, doc)
+
+
+def remove(question_ids):
+    """Drop deleted question ids from every bucket."""
+    doomed = set(question_ids)
+    with _lock:
+        for buckets in (_buckets, _doc_buckets):
+            for key, bucket in buckets.items():
+                buckets[key] = array("q", (qid for qid in bucket if qid not in doomed))
+
+
+def _sample_locked(bucket, exclude):
+    n = len(bucket)
+    if n == 0:
+        return None
+    for _ in range(min(MAX_PROBES, n)):
+        qid = bucket[random.randrange(n)]
+        if qid not in exclude:
+            return qid
+    # Bucket is mostly seen; pick uniformly from what is left
+    remaining = [qid for qid in bucket if qid not in exclude]
+    return random.choice(remaining) if remaining else None
+
+
+def _sample_scoped_locked(difficulty, category, exclude, documents):
+    if documents is None:
+        return _sample_locked(_buckets.get((difficulty, category), ()), exclude)
+    # Pick a document in proportion to its bucket size, falling back to the others
+    buckets = [b for b in (_doc_buckets.get((doc, difficulty, category)) for doc in documents) if b]
+    while buckets:
+        bucket = random.choices(buckets, weights=[len(b) for b in buckets])[0]
+        qid = _sample_locked(bucket, exclude)
+        if qid is not None:
+            return qid
+        buckets.remove(bucket)
+    return None
+
+
+def sample(difficulty, category, exclude=(), documents=None):
+    """Random question id in the bucket that is not in `exclude`, or None.
+
+    Either filter may be None to mean "any"; `documents` limits the pick to
+    questions from those corpus documents. A miss triggers one incremental
+    refresh in case another process has added questions since we loaded.
+    """
+    _ensure_fresh()
+    exclude = exclude if isinstance(exclude, (set, frozenset)) else set(exclude)
+    with _lock:
+        qid = _sample_scoped_locked(difficulty, category, exclude, documents)
+    if qid is None and refresh():
+        with _lock:
+            qid = _sample_scoped_locked(difficulty, category, exclude, documents)
+    return qid
+
+
+def sample_many(difficulty, category, k, exclude=(), documents=None):
+    """Up to k distinct random ids from a bucket, none of them in `exclude`."""
+    _ensure_fresh()
+    taken = set(exclude)
+    picked = []
+    with _lock:
+        for _ in range(k):
+            qid = _sample_scoped_locked(difficulty, category, taken, documents)
+            if qid is None:
+                break
+            taken.add(qid)
+            picked.append(qid)
+    return picked
+
+
+def bucket_size(difficulty, category, documents=None):
+    _ensure_fresh()
+    with _lock:
+        if documents is None:
+            return len(_buckets.get((difficulty, category), ()))
+        return sum(len(_doc_buckets.get((doc, difficulty, category), ())) for doc in documents)
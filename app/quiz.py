@@ -1,30 +1,39 @@
 import random
 import json
-import fitz 
-import sqlite3
 from flask import session
-from .config import DB_PATH, PDF_PATH
-from .llm import generate_questions, generate_questions_for
-from .db import save_questions
+from .config import REPLENISH_FIRST_QUESTION_WAIT_S, NUM_QUESTIONS_PER_QUIZ
+from .connection import fetchone
+from .pdf_cache import load_document
+from . import catalog, question_index
+from .logger import logger
+from .replenish import request_refill, neighbouring_difficulties, wait_for_question, wait_for_documents
 
 # --- Helpers ---
 
 
 def parse_pdf(file_path):
-    doc = fitz.open(file_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return text
+    return load_document(file_path).text()
 
 def get_user_id():
     return session.get("user_id")
 
+LEVELS = ['easy', 'medium', 'hard']
+# adjust_difficulty_pro stays on "easy" until this many answers are in
+WARMUP_ANSWERS = 6
+
+def reachable_levels(slot, difficulty):
+      """Difficulty levels question `slot` (0-based) can be asked at."""
+      if difficulty != "Progressive":
+            return [difficulty] if difficulty in LEVELS else []
+      if slot < WARMUP_ANSWERS:
+            return LEVELS[:1]
+      # The level moves at most one step per answer after the warm-up
+      return LEVELS[:min(slot - WARMUP_ANSWERS + 1, len(LEVELS) - 1) + 1]
+
 def adjust_difficulty_pro():
-      if len(session["answer_track"]) < 6:
+      if len(session["answer_track"]) < WARMUP_ANSWERS:
             return "easy"
-      levels = ['easy', 'medium', 'hard']
+      levels = LEVELS
       idx = session["level_index"]
       last_three = session["answer_track"][-3:]
       
@@ -38,10 +47,9 @@ def adjust_difficulty_pro():
       return levels[idx]
 
 def choose_next_category(weights_dict):
-    print("choose_next_category")
     """Choose next category using weighted random selection."""
     if not weights_dict:
-        print("not weights_dict")  
+        logger.debug("no category weights")
         return None
 
     categories = list(weights_dict.keys())
@@ -58,24 +66,26 @@ def evaluate_answer_from_db(prompt, correct_answer, user_answer, explanation):
         "correct": is_correct,
         "explanation": explanation
     }
+def _scope():
+      """Documents to sample from: the quiz's corpus documents, else only the PDF_PATH chapter."""
+      documents = session.get("documents")
+      return documents if documents is not None else catalog.CHAPTER
+
 def get_qn_from_db(difficulty, category):
-      query = "SELECT * FROM questions WHERE difficulty_level = ?"
-      params = [difficulty]
       if category is not None:
-            query += " AND category = ?"
-            params.append(category)
-            print(f"Querying for category: {category} with difficulty: {difficulty}")    
-      used_ids = session.get("used_ids", [])
-      if used_ids:
-            placeholder = ",".join(["?"] * len(used_ids))
-            query += f" AND id NOT IN ({placeholder})"
-            params.extend(used_ids)
-
-      query += " ORDER BY RANDOM() LIMIT 1"
-      with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.execute(query, params)
-            return cur.fetchone()
+            logger.debug("Querying for category: %s with difficulty: %s", category, difficulty)    
+      used = set(session.get("used_ids", []))
+      question_id = question_index.sample(difficulty, category, used, _scope())
+      if question_id is None:
+            return None
+      row = fetchone("SELECT * FROM questions WHERE id = ?", (question_id,))
+      if row is None:
+            # Deleted by a dedupe in another process; reload the index and draw again
+            question_index.refresh()
+            catalog.refresh()
+            question_id = question_index.sample(difficulty, category, used, _scope())
+            row = fetchone("SELECT * FROM questions WHERE id = ?", (question_id,)) if question_id is not None else None
+      return row
 
 def update_used_ids(question_id):
       if "used_ids" not in session:
@@ -97,26 +107,116 @@ def build_question_dict(row):
             "category": row[8]
             }
           
-def get_random_unseen_question():
-      MAX_RETRIES = 1
-      user_id = get_user_id()
-      if not user_id:
-            raise Exception("User not logged in")  
+def plan_quiz():
+      """Pick candidate question ids for every slot of the quiz up front.
+
+      Slot categories are drawn from the session weights; each slot gets one
+      candidate per difficulty level it can be asked at, drawn with one
+      batched sample per (category, difficulty) bucket. Buckets that cannot
+      cover their slots get a background refill.
+      """
+      difficulty = session.get("difficulty")
+      documents = session.get("documents")
+      weights = session.get("weights") or {}
+      categories = random.choices(list(weights), weights=list(weights.values()), k=NUM_QUESTIONS_PER_QUIZ) if weights else [None] * NUM_QUESTIONS_PER_QUIZ
+      wanted = {}
+      for slot, category in enumerate(categories):
+            for level in reachable_levels(slot, difficulty):
+                  wanted.setdefault((category, level), []).append(slot)
+      taken = set(session.get("used_ids", []))
+      plan = [{"category": category, "candidates": {}} for category in categories]
+      for (category, level), slots in wanted.items():
+            ids = question_index.sample_many(level, category, len(slots), taken, _scope())
+            taken.update(ids)
+            for slot, qid in zip(slots, ids):
+                  plan[slot]["candidates"][level] = qid
+            if len(ids) < len(slots):
+                  request_refill(category, level, force=True, documents=documents)
+      session["plan"] = plan
+      session["next_question"] = None
+      return plan
+
+def _current_difficulty():
       difficulty = session.get("difficulty")
       if difficulty == "Progressive":
             difficulty = adjust_difficulty_pro()
-      category = choose_next_category(session["weights"])
-      for retry in range(MAX_RETRIES + 1):                            
-            row = get_qn_from_db(difficulty, category)          
+      return difficulty
+
+def next_question():
+      """The question for the current slot: a keyed lookup of its planned candidate.
+
+      Falls back to live selection when the slot has no unseen candidate at
+      the current difficulty.
+      """
+      slot = session.get("index", 0)
+      plan = session.get("plan") or []
+      difficulty = _current_difficulty()
+      category = plan[slot]["category"] if slot < len(plan) else None
+      qid = plan[slot]["candidates"].get(difficulty) if slot < len(plan) else None
+      if qid is not None and qid not in session.get("used_ids", []):
+            row = fetchone("SELECT * FROM questions WHERE id = ?", (qid,))
             if row:
                   return build_question_dict(row)
-            print("❌ No unique questions found. Generating more...")
-            text = parse_pdf(PDF_PATH)
-            questions = generate_questions_for(text, difficulty, category)
-            save_questions(questions)
-      category = None
+      return get_random_unseen_question(difficulty, category)
+
+def prefetch_next_question():
+      """Resolve the next question into the session while the user reads feedback."""
+      if session.get("next_question") is None and session.get("index", 0) < NUM_QUESTIONS_PER_QUIZ:
+            session["next_question"] = next_question()
+
+def take_question():
+      """The prefetched question if there is one, else the next one resolved now."""
+      q = session.get("next_question")
+      session["next_question"] = None
+      return q if q is not None else next_question()
+
+def get_random_unseen_question(difficulty=None, category=None):
+      """Serve a question from stock only; never generates on the request thread.
+
+      When the chosen bucket has nothing unseen left, a background refill is
+      queued for it and the question comes from the nearest bucket instead:
+      same category at a neighbouring difficulty, then any category at those
+      difficulties, then anything unseen at all. Only when nothing unseen is
+      stocked anywhere does the request wait, for the first question the
+      streaming refill of the chosen bucket stores. Quizzes scoped to corpus
+      documents only look within, and only refill, those documents.
+      """
+      user_id = get_user_id()
+      if not user_id:
+            raise Exception("User not logged in")  
+      if difficulty is None:
+            difficulty = _current_difficulty()
+      if category is None:
+            category = choose_next_category(session["weights"])
+      documents = session.get("documents")
       row = get_qn_from_db(difficulty, category)
-      return build_question_dict(row)
-      
-  
-  
\ No newline at end of file
+      if row:
+            request_refill(category, difficulty, documents=documents)
+            return build_question_dict(row)
+      logger.info("No unseen questions in (%s, %s); falling back to a neighbouring bucket", category, difficulty)
+      request_refill(category, difficulty, force=True, documents=documents)
+      neighbours = [diff for diff in neighbouring_difficulties(difficulty) if diff != difficulty]
+      fallbacks = [(diff, category) for diff in neighbours]
+      fallbacks += [(diff, None) for diff in [difficulty] + neighbours]
+      fallbacks.append((None, None))
+      tried = {(difficulty, category)}
+      for diff, cat in fallbacks:
+            if (diff, cat) in tried:
+                  continue
+            tried.add((diff, cat))
+            row = get_qn_from_db(diff, cat)
+            if row:
+                  return build_question_dict(row)
+      if documents is not None:
+            if wait_for_documents(documents, category, difficulty, REPLENISH_FIRST_QUESTION_WAIT_S):
+                  row = get_qn_from_db(None, None)
+                  if row:
+                        return build_question_dict(row)
+            raise Exception("No questions for this course yet; replenishment in progress")
+      question_id = wait_for_question(category, difficulty, REPLENISH_FIRST_QUESTION_WAIT_S)
+      if question_id is not None:
+            # Deleted again already if a dedupe ran meanwhile
+            row = fetchone("SELECT * FROM questions WHERE id = ?", (question_id,)) or get_qn_from_db(None, None)
+            if row:
+                  return build_question_dict(row)
+      raise Exception("Question bank is empty; replenishment in progress")
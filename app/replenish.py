@@ -0,0 +1,440 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pydantic import ValidationError
+from .config import (PDF_PATH, RETRIEVAL_TOP_K, REPLENISH_LOW_WATERMARK, REPLENISH_HIGH_WATERMARK,
+                     REPLENISH_WORKERS, REPLENISH_BATCH_BUCKETS, REPLENISH_BATCH_QUESTIONS,
+                     REPLENISH_STREAMING)
+from .llm import generate_questions, generate_questions_for, generate_questions_batch, stream_questions_for
+from .models import Question
+from .db import save_questions
+from .connection import fetchall
+from . import catalog
+from .retrieval import relevant_text
+from .asgi import wait
+from .logger import logger
+from .metrics import Gauge, Histogram
+
+DIFFICULTY_LEVELS = ["easy", "medium", "hard"]
+
+# Stop topping up a bucket after this many empty LLM responses in a row
+MAX_EMPTY_BATCHES = 2
+# A forced document refill for a bucket is reused this long after it finishes,
+# so suspended requests replaying (and users exhausting it together) share one
+FORCED_REFILL_REUSE_S = 30
+
+_executor = ThreadPoolExecutor(max_workers=REPLENISH_WORKERS, thread_name_prefix="replenish")
+_lock = threading.Lock()
+_inflight = set()    # buckets with a queued or running refill
+_topping_up = set()  # buckets that fell below the low watermark and have not reached the high one
+_waiters = {}        # bucket -> futures of requests waiting for its next new question
+_documents = {}      # corpus document id -> future of its latest refill
+_forced = {}         # (document id, category, difficulty) -> future of its latest forced refill
+
+
+STOCK = Gauge("quiz_question_stock", "Questions in the bank per bucket", ["category", "difficulty"],
+              collect=catalog.counts)
+INFLIGHT = Gauge("quiz_refills_inflight", "Buckets with a queued or running refill",
+                 collect=lambda: {(): len(_inflight)})
+REFILL_LATENCY = Histogram("quiz_refill_seconds", "Background refill duration", ["outcome"])
+_refill_stats = {"runs": 0, "failures": 0, "questions_added": 0,
+                 "total_seconds": 0.0, "last_seconds": None}
+
+
+def refresh_stock():
+    """Per-bucket counts of PDF_PATH questions, after folding in rows other processes added.
+
+    Unscoped refills generate from PDF_PATH, so corpus documents' stock must
+    not hide its deficits.
+    """
+    catalog.refresh()
+    return catalog.counts(catalog.CHAPTER)
+
+
+def get_stock(category, difficulty):
+    return catalog.count(category, difficulty, catalog.CHAPTER)
+
+
+def neighbouring_difficulties(difficulty):
+    """Difficulty levels ordered by distance from the requested one."""
+    if difficulty not in DIFFICULTY_LEVELS:
+        return list(DIFFICULTY_LEVELS)
+    idx = DIFFICULTY_LEVELS.index(difficulty)
+    return sorted(DIFFICULTY_LEVELS, key=lambda level: abs(DIFFICULTY_LEVELS.index(level) - idx))
+
+
+def request_refill(category, difficulty, force=False, documents=None):
+    """Queue a background top-up for a bucket. Never blocks the caller.
+
+    A bucket is refilled when it is below the low watermark, or when `force`
+    is set (a session has exhausted it). Duplicate requests for a bucket that
+    is already queued or running are dropped. With `documents`, the scoped
+    corpus document with the least stock in the bucket is topped up instead.
+    """
+    if documents is not None:
+        return _request_document_refill(documents, category, difficulty, force) is not None
+    if category is None or difficulty is None:
+        return False
+    key = (category, difficulty)
+    stock = get_stock(category, difficulty)
+    with _lock:
+        if key in _inflight:
+            return False
+        if not force and stock >= REPLENISH_LOW_WATERMARK:
+            return False
+        _inflight.add(key)
+    _executor.submit(_refill_bucket, category, difficulty, force)
+    return True
+
+
+def find_deficits():
+    """(category, difficulty, shortfall to the high watermark) for idle buckets needing stock.
+
+    A bucket starts topping up when it drops below the low watermark and
+    keeps going until it reaches the high one.
+    """
+    stock = refresh_stock()
+    deficits = []
+    with _lock:
+        for cat in sorted({cat for cat, _ in stock}):
+            for diff in DIFFICULTY_LEVELS:
+                key, count = (cat, diff), stock.get((cat, diff), 0)
+                if count < REPLENISH_LOW_WATERMARK:
+                    _topping_up.add(key)
+                elif count >= REPLENISH_HIGH_WATERMARK:
+                    _topping_up.discard(key)
+                if key in _topping_up and key not in _inflight:
+                    deficits.append((cat, diff, REPLENISH_HIGH_WATERMARK - count))
+    return deficits
+
+
+def plan_batches(deficits):
+    """Pack deficits into LLM requests of bounded bucket and question counts.
+
+    Each bucket asks for at most its fair share of a request, so one deep
+    deficit cannot crowd the others out; the rest is filled on a later round.
+    Deficits arrive grouped by category, so buckets of one category tend to
+    share a request and its retrieved passages.
+    """
+    per_bucket = max(1, REPLENISH_BATCH_QUESTIONS // REPLENISH_BATCH_BUCKETS)
+    batches, current, size = [], [], 0
+    for cat, diff, deficit in deficits:
+        count = min(deficit, per_bucket)
+        if current and (len(current) >= REPLENISH_BATCH_BUCKETS or size + count > REPLENISH_BATCH_QUESTIONS):
+            batches.append(current)
+            current, size = [], 0
+        current.append((cat, diff, count))
+        size += count
+    if current:
+        batches.append(current)
+    return batches
+
+
+def check_and_refill():
+    """Queue batched refills for every known bucket below the low watermark."""
+    deficits = find_deficits()
+    if not catalog.counts(catalog.CHAPTER):
+        _seed_empty_bank()
+        return
+    for batch in plan_batches(deficits):
+        with _lock:
+            batch = [b for b in batch if (b[0], b[1]) not in _inflight]
+            _inflight.update((cat, diff) for cat, diff, _ in batch)
+        if batch:
+            _executor.submit(_refill_batch, batch)
+
+
+def validate_questions(items, batch):
+    """Questions from an LLM response that fit a requested bucket, up to its count.
+
+    Items that fail the Question schema, name a bucket that was not asked
+    for, or whose answer is not among the choices are dropped. Category and
+    difficulty are normalised to the requested spelling.
+    """
+    wanted = {(cat.strip().lower(), diff.strip().lower()): (cat, diff, count) for cat, diff, count in batch}
+    taken = Counter()
+    accepted = []
+    for item in items or []:
+        try:
+            q = Question.model_validate(item)
+        except ValidationError:
+            continue
+        key = (q.category.strip().lower(), q.difficulty_level.strip().lower())
+        if key not in wanted or taken[key] >= wanted[key][2] or q.answer not in q.choices:
+            continue
+        taken[key] += 1
+        q.category, q.difficulty_level = wanted[key][0], wanted[key][1]
+        accepted.append(q.model_dump())
+    return accepted
+
+
+def _context_for(categories, pdf_path=PDF_PATH):
+    from .quiz import parse_pdf
+    if RETRIEVAL_TOP_K <= 0:
+        return parse_pdf(pdf_path)
+    unique = list(dict.fromkeys(categories))
+    return relevant_text(pdf_path, " ".join(unique), k=RETRIEVAL_TOP_K * min(len(unique), 3))
+
+
+def _refill_batch(batch):
+    start = time.perf_counter()
+    added = 0
+    try:
+        questions = generate_questions_batch(_context_for([cat for cat, _, _ in batch]), batch)
+        ids = save_questions(validate_questions(questions, batch)) or []
+        added = len(ids)
+        _publish_saved(ids)
+        _record_refill(start, added)
+        logger.info("batch refill of %d buckets added %d questions", len(batch), added)
+    except Exception as e:
+        _record_failure(start, e)
+    finally:
+        with _lock:
+            for cat, diff, _ in batch:
+                _inflight.discard((cat, diff))
+    # Buckets the model under-filled get another round, as long as we make progress
+    if added:
+        check_and_refill()
+
+
+def _seed_empty_bank():
+    """An empty bank has no categories yet; seed it from the whole chapter."""
+    key = (None, None)
+    with _lock:
+        if key in _inflight:
+            return
+        _inflight.add(key)
+    _executor.submit(_run_seed)
+
+
+def _run_seed():
+    from .quiz import parse_pdf
+    start = time.perf_counter()
+    try:
+        ids = save_questions(generate_questions(parse_pdf(PDF_PATH))) or []
+        _publish_saved(ids)
+        _record_refill(start, len(ids))
+    except Exception as e:
+        _record_failure(start, e)
+    finally:
+        with _lock:
+            _inflight.discard((None, None))
+    refresh_stock()
+
+
+# --- Corpus documents ---
+
+def _request_document_refill(documents, category, difficulty, force):
+    if not documents:
+        return None
+    stock = {doc: catalog.count(category, difficulty, [doc]) for doc in documents}
+    doc = min(documents, key=stock.get)
+    if not force and stock[doc] >= REPLENISH_LOW_WATERMARK:
+        return None
+    key = (doc, category, difficulty)
+    now = time.monotonic()
+    with _lock:
+        if force:
+            previous = _forced.get(key)
+            if previous is not None and (not previous.done() or
+                                         now - getattr(previous, "finished_at", now) < FORCED_REFILL_REUSE_S):
+                return previous
+        future = _documents.get(doc)
+        if future is None or future.done():
+            future = _documents[doc] = _executor.submit(refill_document, doc, force)
+            future.add_done_callback(lambda f: setattr(f, "finished_at", time.monotonic()))
+        if force:
+            for stale in [k for k, f in _forced.items()
+                          if f.done() and now - getattr(f, "finished_at", now) >= FORCED_REFILL_REUSE_S]:
+                del _forced[stale]
+            _forced[key] = future
+    return future
+
+
+def wait_for_documents(documents, category, difficulty, timeout):
+    """Force a refill of the scoped documents and block up to `timeout` for it to finish."""
+    future = _request_document_refill(documents, category, difficulty, force=True)
+    if future is None:
+        return False
+    try:
+        return wait(future, timeout) > 0
+    except Exception:
+        return False
+
+
+def refill_document(document_id, force=False):
+    """Top up one corpus document's buckets; returns how many questions were added.
+
+    Buckets below the low watermark (any below the high one when `force` is
+    set) are filled to the high watermark from the document's own passages.
+    A document without questions is seeded from its whole text.
+    """
+    from .corpus import document_path
+    from .quiz import parse_pdf
+    start = time.perf_counter()
+    added = 0
+    try:
+        path = document_path(document_id)
+        catalog.refresh()
+        stock = catalog.counts([document_id])
+        if not stock:
+            questions = generate_questions(parse_pdf(path)) or []
+            added = len(save_questions([dict(q, document_id=document_id) for q in questions]) or [])
+        threshold = REPLENISH_HIGH_WATERMARK if force else REPLENISH_LOW_WATERMARK
+        deficits = [(cat, diff, REPLENISH_HIGH_WATERMARK - stock.get((cat, diff), 0))
+                    for cat in sorted({cat for cat, _ in stock}) for diff in DIFFICULTY_LEVELS
+                    if stock.get((cat, diff), 0) < threshold]
+        for batch in plan_batches(deficits):
+            questions = generate_questions_batch(_context_for([cat for cat, _, _ in batch], path), batch)
+            accepted = [dict(q, document_id=document_id) for q in validate_questions(questions, batch)]
+            added += len(save_questions(accepted) or [])
+        _record_refill(start, added)
+        logger.info("refilled document %s with %d questions", document_id, added)
+    except Exception as e:
+        _record_failure(start, e)
+    return added
+
+
+def wait_for_question(category, difficulty, timeout):
+    """Block up to `timeout` for the next question stored in a bucket; returns its id or None.
+
+    Forces a refill of the bucket, so with streaming enabled this returns
+    after roughly one question's worth of generation time.
+    """
+    if category is None or difficulty is None:
+        return None
+    future = question_future(category, difficulty)
+    try:
+        return wait(future, timeout, owned=True)
+    except FutureTimeout:
+        future.cancel()
+        return None
+
+
+def question_future(category, difficulty):
+    """Future of the id of the next question stored in a bucket; forces a refill of it."""
+    key = (category, difficulty)
+    future = Future()
+    with _lock:
+        _waiters.setdefault(key, []).append(future)
+    future.add_done_callback(lambda f: _drop_waiter(key, f))
+    request_refill(category, difficulty, force=True)
+    return future
+
+
+def _drop_waiter(key, future):
+    with _lock:
+        waiters = _waiters.get(key, [])
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            _waiters.pop(key, None)
+
+
+def _publish(key, question_ids):
+    if not question_ids:
+        return
+    with _lock:
+        waiters = list(_waiters.get(key, ()))
+    for waiter in waiters:
+        try:
+            waiter.set_result(question_ids[0])
+        except InvalidStateError:
+            pass    # cancelled after timing out
+
+
+def _publish_saved(question_ids):
+    """_publish stored questions that may span several buckets, each to its own waiters."""
+    with _lock:
+        if not question_ids or not _waiters:
+            return
+    rows = fetchall(f"SELECT id, category, difficulty_level FROM questions WHERE id IN ({','.join('?' * len(question_ids))})",
+                    question_ids)
+    by_bucket = {}
+    for qid, cat, diff in rows:
+        by_bucket.setdefault((cat, diff), []).append(qid)
+    for key, ids in by_bucket.items():
+        _publish(key, ids)
+
+
+def _generate_into(key, text):
+    """Run one generation pass for a bucket and store the results; returns how many were added."""
+    category, difficulty = key
+    if not REPLENISH_STREAMING:
+        ids = save_questions(validate_questions(generate_questions_for(text, difficulty, category), [(category, difficulty, 1000)]))
+        _publish(key, ids)
+        return len(ids or [])
+    added = 0
+    for item in stream_questions_for(text, difficulty, category):
+        ids = save_questions(validate_questions([item], [(category, difficulty, 1)]))
+        _publish(key, ids)
+        added += len(ids or [])
+    return added
+
+
+def _refill_bucket(category, difficulty, force):
+    from .quiz import parse_pdf
+    key = (category, difficulty)
+    start = time.perf_counter()
+    added = 0
+    try:
+        # Send only the passages about this category unless retrieval is off
+        text = relevant_text(PDF_PATH, category) if RETRIEVAL_TOP_K > 0 else parse_pdf(PDF_PATH)
+        empty_batches = 0
+        while empty_batches < MAX_EMPTY_BATCHES:
+            count = _generate_into(key, text)
+            if not count:
+                empty_batches += 1
+                continue
+            empty_batches = 0
+            added += count
+            refresh_stock()
+            if force or get_stock(category, difficulty) >= REPLENISH_HIGH_WATERMARK:
+                break
+        _record_refill(start, added)
+        logger.info("refilled %s/%s with %d questions", category, difficulty, added)
+    except Exception as e:
+        _record_failure(start, e)
+    finally:
+        with _lock:
+            _inflight.discard(key)
+
+
+def _record_refill(start, added):
+    elapsed = time.perf_counter() - start
+    REFILL_LATENCY.observe(elapsed, outcome="ok")
+    with _lock:
+        _refill_stats["runs"] += 1
+        _refill_stats["questions_added"] += added
+        _refill_stats["total_seconds"] += elapsed
+        _refill_stats["last_seconds"] = elapsed
+
+
+def _record_failure(start, error):
+    logger.error("refill failed: %s", error)
+    REFILL_LATENCY.observe(time.perf_counter() - start, outcome="error")
+    with _lock:
+        _refill_stats["failures"] += 1
+        _refill_stats["last_seconds"] = time.perf_counter() - start
+
+
+def replenish_status():
+    """Snapshot of stock levels and refill latency for the /stock endpoint."""
+    stock = catalog.counts()
+    with _lock:
+        runs = _refill_stats["runs"]
+        return {
+            "watermarks": {"low": REPLENISH_LOW_WATERMARK, "high": REPLENISH_HIGH_WATERMARK},
+            "stock": [
+                {"category": cat, "difficulty_level": diff, "count": count}
+                for (cat, diff), count in sorted(stock.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1])))
+            ],
+            "by_difficulty": catalog.difficulty_counts(),
+            "inflight": [{"category": cat, "difficulty_level": diff} for cat, diff in _inflight],
+            "documents_inflight": sorted(doc for doc, future in _documents.items() if not future.done()),
+            "refills": {
+                **_refill_stats,
+                "avg_seconds": (_refill_stats["total_seconds"] / runs) if runs else None,
+            },
+        }
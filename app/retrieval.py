@@ -0,0 +1,134 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from .config import PDF_CACHE_DIR, RETRIEVAL_TOP_K
+from .pdf_cache import file_hash, load_document
+
+# Bump when chunking or tokenisation changes so persisted indexes are rebuilt
+INDEX_VERSION = 1
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+K1, B = 1.5, 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were "
+    "will with which we can these those their there then than so such also into if not".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+_indexes = {}   # index path -> BM25Index
+
+
+def tokenize(text):
+    tokens = []
+    for tok in _TOKEN.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        if len(tok) > 4 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def chunk_pages(pages):
+    """Overlapping word windows over each page, as {"page", "text"} dicts."""
+    chunks = []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for page_no, page in enumerate(pages):
+        words = page.split()
+        for start in range(0, max(1, len(words) - CHUNK_OVERLAP), step):
+            text = " ".join(words[start:start + CHUNK_WORDS])
+            if text:
+                chunks.append({"page": page_no, "text": text})
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks, term_freqs, doc_freqs):
+        self.chunks = chunks
+        self.term_freqs = [Counter(tf) for tf in term_freqs]
+        self.doc_freqs = doc_freqs
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    @classmethod
+    def build(cls, pages):
+        chunks = chunk_pages(pages)
+        term_freqs = [Counter(tokenize(c["text"])) for c in chunks]
+        doc_freqs = Counter()
+        for tf in term_freqs:
+            doc_freqs.update(tf.keys())
+        return cls(chunks, term_freqs, dict(doc_freqs))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks, "term_freqs": [dict(tf) for tf in self.term_freqs],
+                       "doc_freqs": self.doc_freqs}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data["term_freqs"], data["doc_freqs"])
+
+    def search(self, query, k):
+        """Indexes of the top-k chunks for a query, best first; empty if nothing matches."""
+        n = len(self.chunks)
+        terms = set(tokenize(query))
+        scores = []
+        for i, tf in enumerate(self.term_freqs):
+            score = 0.0
+            norm = K1 * (1 - B + B * self.lengths[i] / self.avg_length) if self.avg_length else K1
+            for term in terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                df = self.doc_freqs.get(term, 0)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                score += idf * freq * (K1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [i for _, i in scores[:k]]
+
+
+def index_path(digest):
+    return os.path.join(PDF_CACHE_DIR, f"{digest}.v{INDEX_VERSION}.bm25.json")
+
+
+def load_index(pdf_path):
+    """BM25 index for a PDF, built from the parsed-page cache on first use."""
+    path = index_path(file_hash(pdf_path))
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(path)
+        if index is None:
+            if os.path.exists(path):
+                index = BM25Index.load(path)
+            else:
+                index = BM25Index.build(load_document(pdf_path).pages())
+                index.save(path)
+            _indexes[path] = index
+    return index
+
+
+def relevant_text(pdf_path, category, k=RETRIEVAL_TOP_K):
+    """The top-k passages about `category`, in document order.
+
+    Falls back to the full chapter text when no passage mentions the
+    category, so generation never runs without context.
+    """
+    index = load_index(pdf_path)
+    hits = index.search(category or "", k)
+    if not hits:
+        return load_document(pdf_path).text()
+    return "\n...\n".join(index.chunks[i]["text"] for i in sorted(hits))
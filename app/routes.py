@@ -1,12 +1,35 @@
-from flask import render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from .quiz import get_user_id, is_quiz_in_progress, evaluate_answer_from_db, get_random_unseen_question
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, Response
+import functools
+import hmac
+from .quiz import get_user_id, is_quiz_in_progress, evaluate_answer_from_db, plan_quiz, take_question, prefetch_next_question
 import sqlite3
-from .config import DB_PATH, NUM_QUESTIONS_PER_QUIZ
-from .llm import get_llm_weights, generate_study_plan
-from .db import get_user_stats, get_latest_study_plan, batch_update_user_stats, save_study_plan
+from .config import NUM_QUESTIONS_PER_QUIZ, DIAGNOSTICS_TOKEN
+from .connection import execute, fetchone, transaction, query_stats
+from .weights import get_weights
+from .db import get_question_stats
+from . import attempts
+from . import profile_cache
+from . import passwords
+from .study_plan import request_study_plan, study_plan_status
 from collections import defaultdict
+import uuid
+from .replenish import replenish_status
+from .llm_gateway import gateway_status
+from .metrics import render as render_metrics
+from .corpus import document_ids, list_documents
+from . import catalog
 from .logger import logger
+from .session_store import regenerate_id
+
+def diagnostic(view):
+      """Serve `view` only to requests bearing DIAGNOSTICS_TOKEN; it exposes SQL text and internals."""
+      @functools.wraps(view)
+      def guarded(*args, **kwargs):
+            sent = request.headers.get("Authorization", "").encode("utf-8")
+            if not DIAGNOSTICS_TOKEN or not hmac.compare_digest(sent, f"Bearer {DIAGNOSTICS_TOKEN}".encode("utf-8")):
+                  return jsonify({"status": "forbidden"}), 403
+            return view(*args, **kwargs)
+      return guarded
 
 def register_routes(app):
       # Add session timeout and cleanup
@@ -26,13 +49,23 @@ def register_routes(app):
                   username = request.form.get("username")
                   password = request.form.get("password")
 
-                  conn = sqlite3.connect(DB_PATH)
-                  cur = conn.cursor()
-                  cur.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
-                  user = cur.fetchone()
-                  conn.close()
+                  user = fetchone("SELECT id, password_hash FROM users WHERE username = ?", (username,))
+
+                  try:
+                        ok, upgraded = passwords.check_login(username, password or "", user[1] if user else None)
+                  except passwords.Throttled as e:
+                        flash(str(e), "error")
+                        return render_template("login.html"), 429, {"Retry-After": str(e.retry_after)}
+                  except passwords.Busy:
+                        flash("The server is busy, please try again in a moment", "error")
+                        return render_template("login.html"), 503, {"Retry-After": "1"}
 
-                  if user and check_password_hash(user[1], password):
+                  if ok:
+                        if upgraded:
+                              with transaction():
+                                    execute("UPDATE users SET password_hash = ? WHERE id = ?", (upgraded, user[0]))
+                        # A fresh id on login, so an id planted before it cannot ride along
+                        regenerate_id(session)
                         session["user_id"] = user[0]
                         session["username"] = username  # Store username in session for easy access
                         return redirect(url_for("start"))
@@ -48,24 +81,25 @@ def register_routes(app):
                   password = request.form.get("password")
                   if not username or not password:
                         return "Missing credentials", 400
+                  # Checked before hashing so a taken name costs no key derivation; the insert still enforces it
+                  if fetchone("SELECT 1 FROM users WHERE username = ?", (username,)):
+                        return "Username already exists", 400
 
-                  conn = sqlite3.connect(DB_PATH)
-                  cur = conn.cursor()
                   try:
-                        password_hash = generate_password_hash(password)
-                        cur.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
-                        conn.commit()
+                        password_hash = passwords.make_hash(password)
+                  except passwords.Busy:
+                        return "Server busy, please try again in a moment", 503, {"Retry-After": "1"}
+                  try:
+                        with transaction():
+                              execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
                         return redirect(url_for("login"))
                   except sqlite3.IntegrityError:
                         return "Username already exists", 400
-                  finally:
-                        conn.close()
             return render_template("register.html")
        
       @app.route("/start", methods=["GET", "POST"])
       def start():
-            print("Enter start")
-            logger.info("Enter start")
+            logger.debug("Enter start")
             user_id = get_user_id()
             if not user_id:
                   return redirect(url_for("login"))
@@ -73,10 +107,20 @@ def register_routes(app):
             if is_quiz_in_progress():
                   return redirect(url_for("question"))
             
-            logger.info("calling get_llm_weights")
-            session["weights"] = get_llm_weights(get_user_id())
-            
-            logger.info("got response from get_llm_weights")
+            # Optional scope: ?document=<id or path> or ?course=<name> from the corpus
+            documents = document_ids(request.values.get("document"), request.values.get("course"))
+            if documents == []:
+                  flash("No ingested documents match that course or document", "error")
+                  return redirect(url_for("profile"))
+            weights = get_weights(user_id)
+            # Unscoped quizzes draw only on the PDF_PATH chapter
+            in_scope = set(catalog.categories(documents if documents is not None else catalog.CHAPTER))
+            scoped = {cat: w for cat, w in weights.items() if cat in in_scope}
+            total = sum(scoped.values())
+            weights = {cat: w / total for cat, w in scoped.items()} if total else weights
+            session["weights"] = weights
+            session["documents"] = documents
+            session["quiz_id"] = uuid.uuid4().hex
 
             session["difficulty"] = "Progressive"
             session["index"] = 0
@@ -86,24 +130,24 @@ def register_routes(app):
             session["answer_track"] = []
             session["answer_history"] = []  # Add this missing variable
             session["level_index"] = 0
+            plan_quiz()
             
-            logger.info("Exit start")
+            logger.debug("Exit start")
             
             return redirect(url_for("question"))
 
       @app.route("/question")
       def question():
-            logger.info("Enter question")
+            logger.debug("Enter question")
             if not get_user_id():
                   return redirect(url_for("login"))
 
             session["last_feedback"] = None
             try:
-                  logger.info("get_random_unseen_question")                  
-                  q = get_random_unseen_question()
-                  logger.info("Question fetched:", q)
+                  q = take_question()
+                  logger.debug("Question fetched: %s", q.get("id"))
             except Exception as e:
-                  logger.error("Error fetching question:", e)
+                  logger.error("Error fetching question: %s", e)
                   return "Error occurred while loading question", 500
 
             session["current_question"] = q
@@ -138,6 +182,8 @@ def register_routes(app):
             # Keep recent 10
             if len(session['answer_history']) > 10:
                   session['answer_history'] = session['answer_history'][-10:]
+            attempts.record_attempt(get_user_id(), q.get("id"), session.get("quiz_id"),
+                                    q.get("category", "general"), q.get("difficulty_level", "medium"), is_correct)
             session["history"].append({
                   "question": q["prompt"],
                   "user_answer": user_answer,
@@ -168,21 +214,29 @@ def register_routes(app):
             session.clear()
             return redirect(url_for("home"))
 
-      @app.route("/profile")  # Unchanged, but stats now reflect batched updates
+      @app.route("/profile")
       def profile():
             if not get_user_id():
                   return redirect(url_for("login"))
             user_id = get_user_id()
-            stats = get_user_stats(user_id)
             in_progress = is_quiz_in_progress()
-            latest_plan = get_latest_study_plan(user_id) or "<ul><li>No study plan available yet. Complete a quiz to generate one.</li></ul>"
-            return render_template(
-                  "profile.html",
-                  stats=stats,
-                  username=session.get("username", "User"),
-                  in_progress=in_progress,
-                  latest_plan=latest_plan
-            )
+            # Unchanged since the browser's copy: one version lookup, no render
+            version = profile_cache.version(user_id)
+            tag = profile_cache.etag(user_id, version, in_progress)
+            if request.if_none_match.contains(tag):
+                  response = Response(status=304)
+            else:
+                  stats, latest_plan = profile_cache.get_profile(user_id, version)
+                  response = Response(render_template(
+                        "profile.html",
+                        stats=stats,
+                        username=session.get("username", "User"),
+                        in_progress=in_progress,
+                        latest_plan=latest_plan or "<ul><li>No study plan available yet. Complete a quiz to generate one.</li></ul>"
+                  ))
+            response.set_etag(tag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
 
       @app.route("/set_difficulty", methods=["POST"])
       def set_difficulty():
@@ -191,7 +245,10 @@ def register_routes(app):
 
             # Store in session or use directly
             session["difficulty"] = difficulty
-            print(f"Difficulty updated to: {difficulty}")
+            logger.debug("Difficulty updated to: %s", difficulty)
+            # Candidates were picked for the old difficulty
+            if session.get("plan") is not None:
+                  plan_quiz()
 
             return jsonify({"status": "success", "difficulty": difficulty})
 
@@ -202,6 +259,11 @@ def register_routes(app):
 
             q = session.get("current_question")
             result = session.get("last_feedback")
+            try:
+                  prefetch_next_question()
+            except Exception as e:
+                  # /question will retry and report it
+                  logger.error("Error prefetching question: %s", e)
             return render_template("feedback.html", question=q, feedback=result, score=session["score"])
 
       @app.route("/result")
@@ -212,10 +274,8 @@ def register_routes(app):
             history = session.get("history", [])
             user_id = get_user_id()
 
-            if history:
-                  # Batch update stats from session history
-                  batch_update_user_stats(user_id, history)
-
+            # Built from the session history alone, so the page never waits on
+            # the attempts writer committing this quiz's last answers
             category_stats = defaultdict(lambda: {"correct": 0, "incorrect": 0})
             difficulty_stats = defaultdict(lambda: {"correct": 0, "incorrect": 0})
 
@@ -231,8 +291,9 @@ def register_routes(app):
             except ZeroDivisionError:
                   score_percent = 0
 
-            study_plan = generate_study_plan(category_stats, difficulty_stats, score_percent, len(history))
-            save_study_plan(user_id, study_plan)
+            # The plan is written by a background job; the page polls for it
+            job = request_study_plan(user_id, session.get("quiz_id"), category_stats, difficulty_stats, score_percent, len(history))
+            study_plan = job["result"]
 
             return render_template(
                   "result.html",
@@ -248,6 +309,45 @@ def register_routes(app):
                   study_plan=study_plan
             )
             
+      @app.route("/study_plan_status")
+      def study_plan_status_view():
+            user_id = get_user_id()
+            if not user_id:
+                  return jsonify({"status": "unauthorized"}), 401
+            # Pending until this quiz's plan is saved, whichever worker runs the job
+            job = study_plan_status(user_id, session.get("quiz_id"))
+            return jsonify({"status": job["status"], "plan": job["result"]})
+
+      @app.route("/stock")
+      @diagnostic
+      def stock():
+            return jsonify(replenish_status())
+
+      @app.route("/db_stats")
+      @diagnostic
+      def db_stats():
+            return jsonify(query_stats())
+
+      @app.route("/llm_stats")
+      @diagnostic
+      def llm_stats():
+            return jsonify(gateway_status())
+
+      @app.route("/documents")
+      def documents():
+            counts = catalog.document_counts()
+            return jsonify([{**doc, "questions": counts.get(doc["id"], 0)}
+                            for doc in list_documents(request.args.get("course"))])
+
+      @app.route("/question_stats/<int:question_id>")
+      def question_stats(question_id):
+            return jsonify(get_question_stats(question_id))
+
+      @app.route("/metrics")
+      @diagnostic
+      def metrics():
+            return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
       @app.route("/ADD_NEW_QA")
       def ADD_NEW_QA():
             pass
\ No newline at end of file
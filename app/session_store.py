@@ -0,0 +1,198 @@
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from .config import SESSION_BACKEND, SESSION_CACHE_SIZE, SESSION_REDIS_URL, SESSION_TOUCH_INTERVAL_S
+from .connection import execute, fetchone, transaction
+
+# Payloads larger than this are zlib-compressed; a leading byte marks which
+COMPRESS_THRESHOLD = 512
+RAW, ZLIB = b"j", b"z"
+
+# Expired sqlite sessions are purged once every this many saves
+PURGE_EVERY = 500
+
+# Bookkeeping keys; a session holding nothing else is not stored
+TOUCHED_KEY = "_touched"
+_BOOKKEEPING = {"_permanent", TOUCHED_KEY}
+
+_serializer = TaggedJSONSerializer()
+
+
+def dumps(data):
+    raw = _serializer.dumps(data).encode("utf-8")
+    if len(raw) > COMPRESS_THRESHOLD:
+        return ZLIB + zlib.compress(raw, 6)
+    return RAW + raw
+
+
+def loads(blob):
+    blob = bytes(blob)
+    raw = zlib.decompress(blob[1:]) if blob[:1] == ZLIB else blob[1:]
+    return _serializer.loads(raw.decode("utf-8"))
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, blob=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.blob = blob     # serialised form as loaded, to skip unchanged writes
+        self.previous_sid = None
+        self.modified = False
+
+
+def regenerate_id(session):
+    """Move the session to a fresh id, dropping the old one; call on login against fixation."""
+    if not session.new:
+        session.previous_sid = session.sid
+    session.sid = secrets.token_urlsafe(32)
+    session.new = True
+    session.blob = None
+    session.modified = True
+
+
+class MemoryBackend:
+    """In-process LRU with TTL. Sessions are not shared between workers."""
+
+    def __init__(self, capacity=SESSION_CACHE_SIZE):
+        self.capacity = capacity
+        self._data = OrderedDict()   # sid -> (expires_at, blob)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return entry[1]
+
+    def set(self, sid, blob, ttl):
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, blob)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteBackend:
+    """Sessions table in the app database; shared by every worker process."""
+
+    def __init__(self):
+        self._saves = 0
+
+    def get(self, sid):
+        row = fetchone("SELECT data FROM sessions WHERE sid = ? AND expires_at >= ?", (sid, time.time()))
+        return row[0] if row else None
+
+    def set(self, sid, blob, ttl):
+        now = time.time()
+        with transaction():
+            execute('''
+                INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            ''', (sid, blob, now + ttl))
+            self._saves += 1
+            if self._saves % PURGE_EVERY == 0:
+                execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def delete(self, sid):
+        with transaction():
+            execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+class RedisBackend:
+    """Any Redis-protocol server (redis, valkey, a local stand-in)."""
+
+    def __init__(self, url=SESSION_REDIS_URL):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, sid):
+        return self._redis.get(f"session:{sid}")
+
+    def set(self, sid, blob, ttl):
+        self._redis.setex(f"session:{sid}", max(1, int(ttl)), blob)
+
+    def delete(self, sid):
+        self._redis.delete(f"session:{sid}")
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data server-side; the cookie only carries an opaque id."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            blob = self.backend.get(sid)
+            if blob is not None:
+                return ServerSideSession(loads(blob), sid=sid, blob=bytes(blob))
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.previous_sid:
+            self.backend.delete(session.previous_sid)
+        if _BOOKKEEPING.issuperset(session):
+            # Requests that never put anything in the session (probes, scrapers,
+            # the login page) get neither a row nor a cookie
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Nested values (lists in the session) change without marking the
+        # session modified, so compare the serialised form instead. An unchanged
+        # session is only rewritten, to push its expiry out, every
+        # SESSION_TOUCH_INTERVAL_S.
+        now = int(time.time())
+        touch = session.new or now - session.get(TOUCHED_KEY, 0) >= SESSION_TOUCH_INTERVAL_S
+        if touch:
+            session[TOUCHED_KEY] = now
+        blob = dumps(dict(session))
+        if blob != session.blob:
+            self.backend.set(session.sid, blob, app.permanent_session_lifetime.total_seconds())
+
+        if touch:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+            response.vary.add("Cookie")
+
+
+def create_session_interface(backend=SESSION_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; expected one of {sorted(BACKENDS)}")
+    return ServerSideSessionInterface(BACKENDS[backend]())
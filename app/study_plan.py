@@ -0,0 +1,40 @@
+from .config import STUDY_PLAN_WORKERS
+from .jobs import JobQueue, PENDING, DONE
+from .llm import generate_study_plan
+from .db import save_study_plan, get_study_plan_for_quiz, get_latest_study_plan
+
+_jobs = JobQueue("study-plan", STUDY_PLAN_WORKERS)
+
+
+def _build_and_save(user_id, quiz_id, category_stats, difficulty_stats, score_percent, total_questions):
+    plan = generate_study_plan(category_stats, difficulty_stats, score_percent, total_questions)
+    save_study_plan(user_id, plan, quiz_id)
+    return plan
+
+
+def request_study_plan(user_id, quiz_id, category_stats, difficulty_stats, score_percent, total_questions):
+    """Queue plan generation for a finished quiz; repeats for the same quiz are ignored."""
+    saved = get_study_plan_for_quiz(user_id, quiz_id)
+    if saved is not None:
+        return {"status": DONE, "result": saved}
+    return _jobs.submit(
+        (user_id, quiz_id), _build_and_save, user_id, quiz_id,
+        {cat: dict(stats) for cat, stats in category_stats.items()},
+        {diff: dict(stats) for diff, stats in difficulty_stats.items()},
+        score_percent, total_questions,
+    )
+
+
+def study_plan_status(user_id, quiz_id):
+    """The plan job for a quiz, from the saved plans when it ran in another worker process.
+
+    Jobs live in the process that queued them, so elsewhere the quiz's plan
+    is pending until its row exists. Without a quiz, the latest plan is done.
+    """
+    job = _jobs.status((user_id, quiz_id))
+    if job is not None:
+        return job
+    if quiz_id is None:
+        return {"status": DONE, "result": get_latest_study_plan(user_id)}
+    plan = get_study_plan_for_quiz(user_id, quiz_id)
+    return {"status": DONE if plan is not None else PENDING, "result": plan}
@@ -0,0 +1,133 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import WEIGHTS_CACHE_TTL_S, WEIGHTS_LLM_REFINE, WEIGHTS_RECENCY_HALF_LIFE_DAYS
+from . import catalog
+from .connection import fetchall, fetchone
+from .logger import logger
+from .metrics import CACHE_LOOKUPS
+
+MIN_WEIGHT, MAX_WEIGHT = 0.1, 1.0
+# Extra share for categories that have not been practised for a while
+RECENCY_BOOST = 0.5
+# Extra share for categories the last study plan asked the user to work on
+PLAN_BOOST = 0.25
+
+_lock = threading.Lock()
+_cache = {}         # user_id -> (normalised weights, expires_at)
+# Bumped by invalidate(); a load that raced an invalidation is not cached
+_versions = {}      # user_id -> version
+_epoch = 0          # every user
+_refiner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weights-llm")
+_refining = set()
+
+
+def compute_weights(rows, categories, study_plan, now=None):
+    """Normalised category weights from (category, correct, total, updated_at) rows.
+
+    Weaker categories get more weight (Laplace-smoothed accuracy), stale ones
+    get up to RECENCY_BOOST extra, and categories named in the study plan get
+    PLAN_BOOST extra. Each raw weight is clamped to [0.1, 1.0] before the
+    whole vector is normalised to sum to 1.
+    """
+    now = now or time.time()
+    by_cat = {cat: (correct or 0, total or 0, updated_at) for cat, correct, total, updated_at in rows}
+    names = list(dict.fromkeys([*by_cat, *categories]))
+    if not names:
+        return {}
+    plan = (study_plan or "").lower()
+    half_life = WEIGHTS_RECENCY_HALF_LIFE_DAYS * 86400
+
+    correct = [by_cat.get(cat, (0, 0, None))[0] for cat in names]
+    total = [by_cat.get(cat, (0, 0, None))[1] for cat in names]
+    seen_at = [by_cat.get(cat, (0, 0, None))[2] for cat in names]
+
+    weakness = [1 - (c + 1) / (t + 2) for c, t in zip(correct, total)]
+    staleness = [1.0 if ts is None else 1 - math.exp(-max(0.0, now - ts) / half_life) for ts in seen_at]
+    emphasis = [PLAN_BOOST if plan and cat.lower() in plan else 0.0 for cat in names]
+
+    raw = [
+        min(MAX_WEIGHT, max(MIN_WEIGHT, w * (1 + RECENCY_BOOST * s) + e))
+        for w, s, e in zip(weakness, staleness, emphasis)
+    ]
+    norm = sum(raw)
+    return {cat: r / norm for cat, r in zip(names, raw)}
+
+
+def _load(user_id):
+    rows = fetchall('''
+        SELECT category, correct, total, updated_at
+        FROM user_category_stats
+        WHERE user_id = ?
+    ''', (user_id,))
+    categories = catalog.categories()
+    plan = fetchone("SELECT plan FROM study_plans WHERE user_id = ? ORDER BY id DESC LIMIT 1", (user_id,))
+    return rows, categories, plan[0] if plan else ""
+
+
+def _version(user_id):
+    return _epoch, _versions.get(user_id, 0)
+
+
+def get_weights(user_id):
+    """Cached local weights for a user; never calls the LLM on the caller's thread.
+
+    Entries live for WEIGHTS_CACHE_TTL_S, which bounds how stale they get
+    when another worker process changed the user's stats.
+    """
+    now = time.time()
+    with _lock:
+        cached = _cache.get(user_id)
+        version = _version(user_id)
+    if cached is not None and cached[1] > now:
+        CACHE_LOOKUPS.inc(cache="weights", result="hit")
+        return dict(cached[0])
+    CACHE_LOOKUPS.inc(cache="weights", result="miss")
+    weights = compute_weights(*_load(user_id))
+    with _lock:
+        if _version(user_id) == version:
+            _cache[user_id] = (weights, now + WEIGHTS_CACHE_TTL_S)
+    if WEIGHTS_LLM_REFINE:
+        _schedule_refinement(user_id)
+    return dict(weights)
+
+
+def invalidate(user_id=None):
+    """Drop cached weights for one user, or for everyone when user_id is None."""
+    global _epoch
+    with _lock:
+        if user_id is None:
+            _epoch += 1
+            _cache.clear()
+        else:
+            _versions[user_id] = _versions.get(user_id, 0) + 1
+            _cache.pop(user_id, None)
+
+
+def _schedule_refinement(user_id):
+    with _lock:
+        if user_id in _refining:
+            return
+        _refining.add(user_id)
+    _refiner.submit(_refine, user_id)
+
+
+def _refine(user_id):
+    """Replace the cached local weights with the LLM's, if it answers sensibly."""
+    from .llm import get_llm_weights
+    with _lock:
+        version = _version(user_id)
+    try:
+        refined = get_llm_weights(user_id)
+        refined = {cat: float(w) for cat, w in refined.items() if isinstance(w, (int, float)) and w > 0}
+        total = sum(refined.values())
+        if total > 0:
+            with _lock:
+                if user_id in _cache and _version(user_id) == version:
+                    _cache[user_id] = ({cat: w / total for cat, w in refined.items()}, _cache[user_id][1])
+    except Exception as e:
+        logger.error("LLM weight refinement failed: %s", e)
+    finally:
+        with _lock:
+            _refining.discard(user_id)
@@ -0,0 +1,210 @@
+"""End-to-end load test of the quiz flow against a scratch database and the fake LLM.
+
+Starts the app from create_app on a local threaded HTTP server, then drives
+concurrent simulated users through register -> login -> /start -> /question
+-> /answer -> /feedback ... -> /result -> /logout. Reports per-route latency
+percentiles, throughput, errors and SQLite write-lock waits, and saves them
+as JSON so runs can be compared across versions.
+
+    python benchmarks/load_test.py --users 20 --quizzes 3 --llm-latency 0.5
+    python benchmarks/load_test.py --out benchmarks/results/new.json --compare benchmarks/results/old.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class SimulatedUser:
+    def __init__(self, base_url, name, recorder):
+        self.base_url = base_url
+        self.name = name
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def call(self, route, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + route, data=body, timeout=120) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except Exception:
+            status = 0
+        self.recorder.record(route, time.perf_counter() - start, status)
+        return status
+
+    def run(self, quizzes, questions):
+        self.call("/register", {"username": self.name, "password": "bench-password"})
+        for _ in range(quizzes):
+            self.call("/login", {"username": self.name, "password": "bench-password"})
+            self.call("/start")
+            for i in range(questions):
+                if self.call("/question") != 200:
+                    break
+                self.call("/answer", {"user_answer": "Option A0"})
+                if i < questions - 1:
+                    self.call("/feedback")
+            self.call("/result")
+            # The result page polls for the study plan; the profile follows it
+            self.call("/study_plan_status")
+            self.call("/profile")
+            self.call("/logout")
+        # A poll from a fresh session finds no job, as after a restart or from
+        # another worker, and falls back to the saved plan
+        self.call("/login", {"username": self.name, "password": "bench-password"})
+        self.call("/study_plan_status")
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            self.samples[route].append(seconds)
+            if status == 0 or status >= 500:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def summarise(recorder, wall_seconds, lock_stats):
+    routes = {}
+    total = 0
+    for route, values in sorted(recorder.samples.items()):
+        values = sorted(values)
+        total += len(values)
+        routes[route] = {
+            "count": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    return {
+        "wall_seconds": wall_seconds,
+        "requests": total,
+        "throughput_rps": total / wall_seconds if wall_seconds else None,
+        "quizzes_completed": len(recorder.samples.get("/result", [])),
+        "routes": routes,
+        "db_lock_waits": lock_stats,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline):
+    print(f"\n{'route':<22}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+    for route, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if before and before.get(key):
+                cells.append(f"{now[key]:8.1f} ({(now[key] / before[key] - 1) * 100:+.0f}%)")
+            else:
+                cells.append(f"{now[key]:8.1f}")
+        print(f"{route:<22}" + "".join(f"{c:>18}" for c in cells))
+    b_rps = baseline.get("throughput_rps")
+    if b_rps:
+        print(f"throughput {current['throughput_rps']:.1f} rps ({(current['throughput_rps'] / b_rps - 1) * 100:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--quizzes", type=int, default=2, help="quizzes per user")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds per call")
+    parser.add_argument("--seed-db", default=os.path.join(ROOT, "data", "qa.db"),
+                        help="database copied as the starting question bank ('' for an empty one)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report of an earlier run to diff against")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="quiz-bench-")
+    db_path = os.path.join(scratch, "bench.db")
+    if args.seed_db:
+        shutil.copy(args.seed_db, db_path)
+    # Configuration is read at import time, so it must be in place before app is imported
+    os.environ.update(DB_PATH=db_path, LLM_BACKEND="fake", LLM_FAKE_LATENCY_S=str(args.llm_latency),
+                      PDF_CACHE_DIR=os.path.join(scratch, "cache"))
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from app.config import NUM_QUESTIONS_PER_QUIZ
+    from app.connection import query_stats
+
+    app = create_app()
+    server = make_server("127.0.0.1", args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    recorder = Recorder()
+    users = [SimulatedUser(base_url, f"bench_user_{i}", recorder) for i in range(args.users)]
+    threads = [threading.Thread(target=u.run, args=(args.quizzes, NUM_QUESTIONS_PER_QUIZ)) for u in users]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    # Time spent in BEGIN IMMEDIATE is time spent waiting for SQLite's write lock
+    lock_stats = next((s for s in query_stats() if s["sql"] == "BEGIN IMMEDIATE"), None)
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"users": args.users, "quizzes": args.quizzes, "llm_latency_s": args.llm_latency,
+                   "questions_per_quiz": NUM_QUESTIONS_PER_QUIZ},
+        **summarise(recorder, wall, lock_stats),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
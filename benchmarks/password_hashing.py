@@ -0,0 +1,161 @@
+"""Login throughput across hash workers, and page latency during a login surge.
+
+"throughput" runs concurrent logins through app.passwords with the hash on
+the request thread (workers 0) and on pools of 1..N processes, and reports
+verified logins per second. "surge" serves the app on a fixed pool of
+request threads while a class's worth of users log in over and over and a
+few others keep loading /profile, first with hashing inline and then on
+the pool. Each configuration runs in its own process, since configuration
+is read at import.
+
+    python benchmarks/password_hashing.py --max-workers 4 --logins 64 --surge 30 --fast 3
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_throughput(args):
+    from werkzeug.security import generate_password_hash
+    from app import passwords
+    from app.config import PASSWORD_HASH_METHOD
+
+    stored = generate_password_hash("bench-password", method=PASSWORD_HASH_METHOD)
+    passwords.check_login("warm-up", "bench-password", stored)   # start the pool outside the timing
+    concurrency = max(args.workers, 1) * 2
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: passwords.check_login(f"user_{i}", "bench-password", stored)[0],
+                                range(args.logins)))
+    wall = time.perf_counter() - start
+    return {"workers": args.workers, "logins": len(results), "ok": sum(results), "seconds": wall,
+            "logins_per_s": len(results) / wall}
+
+
+def run_surge(args):
+    from serving_modes import serve_sync
+    from load_test import Recorder, SimulatedUser, percentile
+    from app import create_app
+
+    app = create_app(background=False)
+    base_url, stop = serve_sync(app, args.threads)
+    recorder = Recorder()
+    users = [SimulatedUser(base_url, f"surge_user_{i}", recorder) for i in range(args.surge + args.fast)]
+    for user in users:
+        user.call("/register", {"username": user.name, "password": "bench-password"})
+    for user in users[args.surge:]:
+        user.call("/login", {"username": user.name, "password": "bench-password"})
+    recorder.samples.clear()
+    recorder.errors.clear()
+
+    statuses = Counter()
+    done = threading.Event()
+
+    def log_in(user):
+        for _ in range(args.rounds):
+            statuses[user.call("/login", {"username": user.name, "password": "bench-password"})] += 1
+
+    def fast(user):
+        while not done.is_set():
+            user.call("/profile")
+
+    start = time.perf_counter()
+    fast_threads = [threading.Thread(target=fast, args=(u,)) for u in users[args.surge:]]
+    surge_threads = [threading.Thread(target=log_in, args=(u,)) for u in users[:args.surge]]
+    for t in fast_threads + surge_threads:
+        t.start()
+    for t in surge_threads:
+        t.join()
+    done.set()
+    for t in fast_threads:
+        t.join()
+    wall = time.perf_counter() - start
+    stop()
+
+    routes = {}
+    for route, values in sorted(recorder.samples.items()):
+        values = sorted(values)
+        routes[route] = {"count": len(values), "p50_ms": percentile(values, 50) * 1000,
+                         "p95_ms": percentile(values, 95) * 1000, "max_ms": values[-1] * 1000}
+    return {"workers": args.workers, "wall_seconds": wall, "login_statuses": dict(statuses),
+            "logins_per_s": statuses[302] / wall, "routes": routes}
+
+
+def child(args):
+    scratch = tempfile.mkdtemp(prefix="quiz-passwords-")
+    try:
+        if args.seed_db:
+            shutil.copy(args.seed_db, os.path.join(scratch, "bench.db"))
+        # Configuration is read at import time, so it must be in place before app is imported
+        os.environ.update(DB_PATH=os.path.join(scratch, "bench.db"), LLM_BACKEND="fake", LOG_FILE="",
+                          PDF_CACHE_DIR=os.path.join(scratch, "cache"), PASSWORD_HASH_WORKERS=str(args.workers))
+        return (run_surge if args.run == "surge" else run_throughput)(args)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def spawn(args, run, workers):
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        argv = [sys.executable, os.path.abspath(__file__), "--run", run, "--workers", str(workers),
+                "--logins", str(args.logins), "--surge", str(args.surge), "--fast", str(args.fast),
+                "--rounds", str(args.rounds), "--threads", str(args.threads), "--seed-db", args.seed_db,
+                "--out", out.name]
+        subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return json.load(open(out.name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--run", choices=["throughput", "surge", "both"], default="both")
+    parser.add_argument("--workers", type=int, help="hash processes for a single run (0 = inline)")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=64, help="logins per throughput run")
+    parser.add_argument("--surge", type=int, default=30, help="users logging in during the surge")
+    parser.add_argument("--fast", type=int, default=3, help="users loading /profile meanwhile")
+    parser.add_argument("--rounds", type=int, default=2, help="logins per surge user")
+    parser.add_argument("--threads", type=int, default=8, help="request threads serving the surge")
+    parser.add_argument("--seed-db", default=os.path.join(ROOT, "data", "qa.db"))
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if args.workers is not None and args.run != "both":
+        report = child(args)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f)
+        else:
+            print(json.dumps(report, indent=2))
+        return
+
+    report = {}
+    if args.run in ("throughput", "both"):
+        report["throughput"] = [spawn(args, "throughput", w) for w in range(args.max_workers + 1)]
+        print(f"{'workers':>8}{'logins/s':>10}")
+        for r in report["throughput"]:
+            print(f"{r['workers'] or 'inline':>8}{r['logins_per_s']:>10.1f}")
+    if args.run in ("surge", "both"):
+        report["surge"] = [spawn(args, "surge", w) for w in (0, args.max_workers)]
+        print(f"\n{'workers':>8}{'route':>10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  login statuses")
+        for r in report["surge"]:
+            for route, s in r["routes"].items():
+                print(f"{r['workers'] or 'inline':>8}{route:>10}{s['count']:>7}{s['p50_ms']:>10.1f}"
+                      f"{s['p95_ms']:>10.1f}{s['max_ms']:>10.1f}  {r['login_statuses'] if route == '/login' else ''}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), **report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
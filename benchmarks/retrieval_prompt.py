@@ -0,0 +1,77 @@
+"""Compare question-generation prompts built from retrieved passages vs the full chapter.
+
+Reports prompt size and end-to-end generate_questions_for latency per
+category for both paths. Runs against the local fake LLM by default; set
+LLM_BACKEND=genai to measure the real model.
+
+    python benchmarks/retrieval_prompt.py --categories "Relative Motion" "Free Fall"
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+from app import llm_gateway                        # noqa: E402
+from app.config import PDF_PATH, LLM_BACKEND       # noqa: E402
+from app.fake_llm import FakeBackend               # noqa: E402
+from app.llm import generate_questions_for         # noqa: E402
+from app.quiz import parse_pdf                     # noqa: E402
+from app.retrieval import relevant_text            # noqa: E402
+
+DEFAULT_CATEGORIES = ["Instantaneous Velocity", "Acceleration", "Relative Motion", "Kinematic Equations", "Free Fall"]
+
+
+def measure(text_for, categories, repeats):
+    rows = []
+    for cat in categories:
+        text = text_for(cat)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            generate_questions_for(text, "medium", cat)
+            timings.append(time.perf_counter() - start)
+        rows.append({"category": cat, "prompt_chars": len(text), "median_s": statistics.median(timings)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", nargs="+", default=DEFAULT_CATEGORIES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="fixed seconds per fake call")
+    parser.add_argument("--fake-latency-per-kchar", type=float, default=0.01, help="seconds per 1000 prompt chars")
+    parser.add_argument("--out", help="write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    if LLM_BACKEND == "fake":
+        llm_gateway.set_backend(FakeBackend(latency=args.fake_latency, latency_per_kchar=args.fake_latency_per_kchar))
+
+    full = measure(lambda cat: parse_pdf(PDF_PATH), args.categories, args.repeats)
+    retrieved = measure(lambda cat: relevant_text(PDF_PATH, cat), args.categories, args.repeats)
+
+    def summary(rows):
+        return {"mean_prompt_chars": statistics.mean(r["prompt_chars"] for r in rows),
+                "mean_latency_s": statistics.mean(r["median_s"] for r in rows)}
+
+    report = {
+        "backend": LLM_BACKEND,
+        "full_text": {"summary": summary(full), "per_category": full},
+        "retrieval": {"summary": summary(retrieved), "per_category": retrieved},
+    }
+    report["prompt_size_reduction"] = 1 - report["retrieval"]["summary"]["mean_prompt_chars"] / report["full_text"]["summary"]["mean_prompt_chars"]
+    report["latency_reduction"] = 1 - report["retrieval"]["summary"]["mean_latency_s"] / report["full_text"]["summary"]["mean_latency_s"]
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
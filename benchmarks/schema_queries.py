@@ -0,0 +1,138 @@
+"""Before/after timings of the hot queries across the schema migrations.
+
+Builds a scratch database at the unversioned baseline schema, fills it with
+synthetic questions, users, study plans, cached LLM responses and sessions,
+times the queries the app runs, then applies the remaining migrations and
+times them again.
+
+    python benchmarks/schema_queries.py --questions 200000 --users 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = [f"category {i}" for i in range(30)]
+DIFFICULTIES = ["easy", "medium", "hard"]
+CATEGORY_COUNT = 12
+
+
+def seed(args):
+    import json
+    from app.connection import executemany, transaction
+
+    rng = random.Random(7)
+    now = time.time()
+    choices = json.dumps([f"Option {c} with some explanatory words" for c in "ABCD"])
+    with transaction():
+        executemany(
+            "INSERT INTO questions (answer, prompt, question_type, hint, explanation, choices, difficulty_level, category)"
+            " VALUES (?, ?, 'mcq', 'hint', 'explanation', ?, ?, ?)",
+            [("Option A", f"Question {i}?", choices, rng.choice(DIFFICULTIES), rng.choice(CATEGORIES))
+             for i in range(args.questions)])
+        executemany("INSERT INTO users (username, password_hash) VALUES (?, 'x')",
+                    [(f"user{i}",) for i in range(args.users)])
+        plan = "<ul>" + "<li>Review the topic in depth.</li>" * 20 + "</ul>"
+        executemany(
+            "INSERT INTO user_category_stats (user_id, category, correct, total, last_study_plan, updated_at)"
+            " VALUES (?, ?, 3, 5, ?, ?)",
+            [(u, cat, plan, now) for u in range(1, args.users + 1) for cat in rng.sample(CATEGORIES, CATEGORY_COUNT)])
+        executemany("INSERT INTO llm_cache (key, response, created_at, last_used) VALUES (?, 'r', ?, ?)",
+                    [(f"k{i}", now - i, now - i) for i in range(args.cache_entries)])
+        executemany("INSERT INTO sessions (sid, data, expires_at) VALUES (?, x'00', ?)",
+                    [(f"s{i}", now + rng.uniform(-3600, 3600)) for i in range(args.sessions)])
+
+
+def queries(users, get_latest_study_plan, save_study_plan):
+    from app.connection import fetchall, fetchone
+
+    rng = random.Random(11)
+    now = time.time()
+    return {
+        "bucket ids (difficulty, category)": lambda: fetchall(
+            "SELECT id FROM questions WHERE difficulty_level = ? AND category = ?",
+            (rng.choice(DIFFICULTIES), rng.choice(CATEGORIES))),
+        "bucket count": lambda: fetchone(
+            "SELECT COUNT(*) FROM questions WHERE difficulty_level = ? AND category = ?",
+            (rng.choice(DIFFICULTIES), rng.choice(CATEGORIES))),
+        "catalog load (GROUP BY)": lambda: fetchall(
+            "SELECT category, difficulty_level, COUNT(*), MAX(id) FROM questions WHERE id > 0"
+            " GROUP BY category, difficulty_level"),
+        "latest study plan": lambda: get_latest_study_plan(rng.randint(1, users)),
+        "save study plan": lambda: save_study_plan(rng.randint(1, users), "<ul><li>new plan</li></ul>"),
+        "llm cache LRU cut-off": lambda: fetchone(
+            "SELECT last_used FROM llm_cache ORDER BY last_used DESC LIMIT 1 OFFSET 1000"),
+        "expired sessions": lambda: fetchone("SELECT COUNT(*) FROM sessions WHERE expires_at < ?", (now,)),
+    }
+
+
+def _plan_for(sql):
+    from app.connection import fetchall
+    return "; ".join(row[3] for row in fetchall("EXPLAIN QUERY PLAN " + sql))
+
+
+def time_all(repeat, *args):
+    results = {}
+    for name, fn in queries(*args).items():
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--cache-entries", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="quiz-schema-")
+    db_path = os.path.join(scratch, "bench.db")
+    # The seeding and "before" scans would otherwise flood the slow-query log
+    os.environ.update(DB_PATH=db_path, SLOW_QUERY_MS="60000")
+    from app.connection import execute, fetchone, transaction
+    from app.db import get_latest_study_plan, save_study_plan
+    from app.migrations import MIGRATIONS, migrate
+
+    def legacy_latest(user_id):
+        return fetchone("SELECT last_study_plan FROM user_category_stats WHERE user_id = ? LIMIT 1", (user_id,))
+
+    def legacy_save(user_id, plan):
+        with transaction():
+            execute("UPDATE user_category_stats SET last_study_plan = ? WHERE user_id = ?", (plan, user_id))
+
+    # Before: the unversioned schema, with plans copied into every category row
+    migrate(target=1)
+    seed(args)
+    execute("VACUUM")
+    before_size = os.path.getsize(db_path)
+    before = time_all(args.repeat, args.users, legacy_latest, legacy_save)
+
+    start = time.perf_counter()
+    migrate()
+    migration_seconds = time.perf_counter() - start
+    execute("VACUUM")
+    after_size = os.path.getsize(db_path)
+    after = time_all(args.repeat, args.users, get_latest_study_plan, save_study_plan)
+
+    print(f"{args.questions} questions, {args.users} users; migrations 2-{len(MIGRATIONS)} took {migration_seconds:.2f}s")
+    print(f"{'query':<36}{'before ms':>12}{'after ms':>12}{'speed-up':>10}")
+    for name in before:
+        print(f"{name:<36}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>9.1f}x")
+    print("\nplan for bucket ids:",
+          _plan_for("SELECT id FROM questions WHERE difficulty_level = 'easy' AND category = 'category 1'"))
+    print(f"database size {before_size / 1e6:.1f} MB before, {after_size / 1e6:.1f} MB after (including new indexes)")
+
+
+if __name__ == "__main__":
+    main()
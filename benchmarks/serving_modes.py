@@ -0,0 +1,181 @@
+"""Sync vs async serving under LLM-bound load, against the fake LLM.
+
+Each mode runs in its own process on a scratch database and corpus, with
+the same number of view threads. "Slow" users each start a quiz scoped to
+a fresh corpus document that has no questions yet, so their first
+/question waits for the LLM to generate some. Meanwhile "fast" users keep
+loading /profile. In sync mode every waiting /question pins a thread and
+the fast route queues behind them. In async mode the waits are suspended
+and the fast route is served as usual.
+
+Both modes run with the default REPLENISH_WORKERS and LLM_MAX_CONCURRENCY.
+Background refills hold a replenish thread while their LLM call runs in
+either mode, so the slow users' wall time is bounded by REPLENISH_WORKERS
+alike; what the modes differ in is what the fast route sees meanwhile.
+
+    python benchmarks/serving_modes.py --slow 16 --fast 4 --threads 4 --llm-latency 1.0
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import Recorder, SimulatedUser, percentile  # noqa: E402
+
+
+def serve_sync(app, threads):
+    """Werkzeug's server with a fixed pool of request threads, like a gthread worker."""
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledServer("127.0.0.1", 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def serve_async(app, threads):
+    import uvicorn
+    from app.asgi import create_asgi_app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_asgi_app(app, threads), host="127.0.0.1", port=port,
+                                           log_level="warning", lifespan="on"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{port}", stop
+
+
+def run_mode(args):
+    scratch = tempfile.mkdtemp(prefix="quiz-serving-")
+    corpus = os.path.join(scratch, "corpus", "bench")
+    os.makedirs(corpus)
+    # Configuration is read at import time, so it must be in place before app is imported.
+    # Every document is a copy of one PDF, so the response cache and dedup are off:
+    # they would serve or reject every document's questions after the first.
+    os.environ.update(DB_PATH=os.path.join(scratch, "bench.db"), LLM_BACKEND="fake",
+                      LLM_FAKE_LATENCY_S=str(args.llm_latency), PDF_CACHE_DIR=os.path.join(scratch, "cache"),
+                      CORPUS_DIR=os.path.join(scratch, "corpus"), LLM_CACHE_ENABLED="false",
+                      DEDUP_ENABLED="false", REPLENISH_FIRST_QUESTION_WAIT_S="120")
+    from app.config import PDF_PATH
+    for i in range(args.slow):
+        shutil.copy(PDF_PATH, os.path.join(corpus, f"doc_{i}.pdf"))
+
+    from app import create_app
+    from app.corpus import ingest, list_documents
+    app = create_app()
+    ingest(workers=2)
+    documents = [doc["id"] for doc in list_documents()]
+    base_url, stop = (serve_async if args.mode == "async" else serve_sync)(app, args.threads)
+
+    recorder = Recorder()
+    users = [SimulatedUser(base_url, f"{args.mode}_user_{i}", recorder) for i in range(args.slow + args.fast)]
+    for user in users:
+        user.call("/register", {"username": user.name, "password": "bench-password"})
+        user.call("/login", {"username": user.name, "password": "bench-password"})
+    recorder.samples.clear()
+    recorder.errors.clear()
+
+    done = threading.Event()
+
+    def slow(user, document):
+        user.call("/start", {"document": document})
+        user.call("/question")
+
+    def fast(user):
+        while not done.is_set():
+            user.call("/profile")
+
+    start = time.perf_counter()
+    fast_threads = [threading.Thread(target=fast, args=(u,)) for u in users[args.slow:]]
+    slow_threads = [threading.Thread(target=slow, args=(u, d)) for u, d in zip(users, documents)]
+    for t in fast_threads + slow_threads:
+        t.start()
+    for t in slow_threads:
+        t.join()
+    done.set()
+    for t in fast_threads:
+        t.join()
+    wall = time.perf_counter() - start
+    stop()
+
+    routes = {}
+    for route, values in sorted(recorder.samples.items()):
+        values = sorted(values)
+        routes[route] = {"count": len(values), "errors": recorder.errors.get(route, 0),
+                         "p50_ms": percentile(values, 50) * 1000, "p95_ms": percentile(values, 95) * 1000,
+                         "max_ms": values[-1] * 1000}
+    shutil.rmtree(scratch, ignore_errors=True)
+    return {"mode": args.mode, "wall_seconds": wall, "routes": routes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--slow", type=int, default=16, help="users whose /question waits for the LLM")
+    parser.add_argument("--fast", type=int, default=4, help="users loading /profile meanwhile")
+    parser.add_argument("--threads", type=int, default=4, help="view threads in either mode")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="fake LLM seconds per call")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        report = run_mode(args)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f)
+        else:
+            print(json.dumps(report, indent=2))
+        return
+    # One process per mode: configuration and module state are per process
+    reports = []
+    for mode in ("sync", "async"):
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            argv = [sys.executable, os.path.abspath(__file__), "--mode", mode, "--slow", str(args.slow),
+                    "--fast", str(args.fast), "--threads", str(args.threads),
+                    "--llm-latency", str(args.llm_latency), "--out", out.name]
+            subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            reports.append(json.load(open(out.name)))
+
+    print(f"{'mode':<8}{'route':<12}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for report in reports:
+        for route, r in report["routes"].items():
+            print(f"{report['mode']:<8}{route:<12}{r['count']:>7}{r['errors']:>8}"
+                  f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['max_ms']:>10.1f}")
+        print(f"{report['mode']:<8}wall {report['wall_seconds']:.2f}s")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "reports": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Cold-start timings: import, app build, warm-up and time to first request.
+
+Each run is a fresh interpreter on a copy of the question bank. It reports
+the time to import the package, build the app, warm its caches and answer
+the first request, and which heavy SDKs ended up imported. With --server it
+also times `gunicorn -c gunicorn.conf.py` from launch to its first answered
+request.
+
+    python benchmarks/startup.py --runs 5 --server
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["google.genai", "fitz", "pydantic"]
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app(background=False)
+t2 = time.perf_counter()
+if {warm}:
+    app.warm_up()
+t3 = time.perf_counter()
+flask_app.test_client().get("/login")
+t4 = time.perf_counter()
+print("RESULT " + json.dumps({{
+    "import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000, "warm_up_ms": (t3 - t2) * 1000,
+    "first_request_ms": (t4 - t3) * 1000, "total_ms": (t4 - t0) * 1000,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_child(env, warm):
+    out = subprocess.run([sys.executable, "-c", CHILD.format(warm=warm, heavy=HEAVY_MODULES)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    line = next(l for l in out.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def time_server(env, workers):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(env, BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY=str(workers))
+    start = time.perf_counter()
+    proc = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=1) as resp:
+                    resp.read()
+                return (time.perf_counter() - start) * 1000
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("gunicorn exited before serving")
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed-db", default=os.path.join(ROOT, "data", "qa.db"))
+    parser.add_argument("--no-warm-up", action="store_true", help="measure the first request on cold caches")
+    parser.add_argument("--server", action="store_true", help="also time gunicorn to its first answered request")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="quiz-startup-")
+    db_path = os.path.join(scratch, "bench.db")
+    if args.seed_db:
+        shutil.copy(args.seed_db, db_path)
+    env = dict(os.environ, DB_PATH=db_path, LLM_BACKEND="fake", PDF_CACHE_DIR=os.path.join(scratch, "cache"),
+               PYTHONPATH=ROOT)
+    try:
+        runs = [run_child(env, not args.no_warm_up) for _ in range(args.runs)]
+        report = {key: statistics.median(r[key] for r in runs)
+                  for key in ("import_ms", "create_app_ms", "warm_up_ms", "first_request_ms", "total_ms")}
+        report["heavy_modules_loaded"] = runs[-1]["loaded"]
+        if args.server:
+            report["gunicorn_first_request_ms"] = statistics.median(
+                time_server(env, args.workers) for _ in range(args.runs))
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+# The app sizes per-process pools (password hashing) from the worker count
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Build and warm the app once, before forking
+preload_app = True
+if SERVER_MODE == "async":
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+# Recycle workers now and then, staggered so they do not all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    # The startup jobs (dedup backfill, initial top-up) run once, in the first worker
+    if worker.age == 1:
+        from app import start_background_jobs
+        start_background_jobs()
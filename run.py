@@ -1,6 +1,13 @@
 from app import create_app
+from app.config import SERVER_MODE
 
-app = create_app()
-
+# Built only when run as a script: the password-hash pool's processes import
+# this module again. `flask run` finds and calls create_app itself.
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app = create_app()
+    if SERVER_MODE == "async":
+        import uvicorn
+        from app.asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(app), host="0.0.0.0", port=5000)
+    else:
+        app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,44 @@
+"""A scratch database and the fake LLM for every test, in place before app is imported."""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH = tempfile.mkdtemp(prefix="quiz-tests-")
+# Configuration is read at import time; subprocesses started by tests inherit it too
+os.environ.update(DB_PATH=os.path.join(SCRATCH, "test.db"), LLM_BACKEND="fake", LOG_FILE="",
+                  PDF_CACHE_DIR=os.path.join(SCRATCH, "cache"), CORPUS_DIR=os.path.join(SCRATCH, "corpus"),
+                  # No background top-ups unless a test starts one
+                  REPLENISH_LOW_WATERMARK="0", REPLENISH_HIGH_WATERMARK="0")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from app.models import init_db
+    init_db()
+    yield
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    from app import create_app
+    return create_app(background=False)
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def make_question(category, difficulty="easy", prompt=None, document_id=None):
+    """A valid question dict for save_questions; prompts are unique unless given."""
+    prompt = prompt or f"Question {os.urandom(6).hex()} about {category}?"
+    return {"answer": "A", "prompt": prompt, "question_type": "multiple_choice", "hint": "h",
+            "explanation": "e", "choices": ["A", "B", "C", "D"], "difficulty_level": difficulty,
+            "category": category, "document_id": document_id}
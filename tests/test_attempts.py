@@ -0,0 +1,16 @@
+from app import attempts
+
+
+def test_result_does_not_wait_for_the_attempts_writer(client, monkeypatch):
+    def flush(timeout=5.0):
+        raise AssertionError("/result waited on the attempts writer")
+
+    monkeypatch.setattr(attempts, "flush", flush)
+    with client.session_transaction() as session:
+        session["user_id"] = 9002
+        session["quiz_id"] = "quiz-with-queued-attempts"
+        session["score"] = 1
+        session["history"] = [{"question": "q", "user_answer": "A", "correct_answer": "A", "explanation": "e",
+                               "correct": True, "category": "kinematics", "difficulty_level": "easy"}]
+    response = client.get("/result")
+    assert response.status_code == 200
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+from app import catalog, question_index
+from app.connection import execute, fetchone, transaction
+from app.db import save_questions
+from app.models import dump_choices
+from conftest import ROOT, make_question
+
+
+def _insert_unsigned(qa):
+    # As stored before near-duplicate detection existed: no signature, no dedup check
+    with transaction():
+        cursor = execute('''
+            INSERT INTO questions (answer, prompt, question_type, hint, explanation, choices, difficulty_level, category)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (qa["answer"], qa["prompt"], qa["question_type"], qa["hint"], qa["explanation"],
+              dump_choices(qa["choices"]), qa["difficulty_level"], qa["category"]))
+    return cursor.lastrowid
+
+
+def test_question_deleted_by_another_process_is_not_served(client):
+    prompt = "Which quantity does the slope of a position time graph of a moving car give?"
+    save_questions([make_question("dedupe keeper", prompt=prompt), make_question("dedupe other")])
+    planned = _insert_unsigned(make_question("dedupe planned", prompt=prompt))
+    question_index.refresh()
+    catalog.refresh()
+    assert question_index.bucket_size("easy", "dedupe planned") == 1
+
+    with client.session_transaction() as session:
+        session.update(user_id=9003, weights={"dedupe planned": 1.0}, documents=None, difficulty="Progressive",
+                       index=0, score=0, used_ids=[], history=[], answer_track=[], answer_history=[],
+                       level_index=0, quiz_id="quiz-with-a-deleted-question", next_question=None,
+                       plan=[{"category": "dedupe planned", "candidates": {"easy": planned}}])
+
+    subprocess.run([sys.executable, "-c", "from app.dedup import dedupe_bank; dedupe_bank()"], cwd=ROOT, check=True)
+    assert fetchone("SELECT 1 FROM questions WHERE id = ?", (planned,)) is None
+
+    response = client.get("/question")
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        assert session["current_question"]["id"] != planned
+    # This process has dropped the deleted id from its index and its counts
+    assert question_index.bucket_size("easy", "dedupe planned") == 0
+    assert catalog.count("dedupe planned", "easy") == 0
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from app import llm_gateway
+
+
+class SlowStream:
+    """Streams `n` chunks, `delay` seconds apart, counting how many it produced."""
+
+    def __init__(self, n=50, delay=0.02):
+        self.n = n
+        self.delay = delay
+        self.produced = 0
+        self.finished = threading.Event()
+
+    def generate_content_stream(self, model, contents, config=None):
+        class Chunk:
+            text = "x"
+        try:
+            for _ in range(self.n):
+                time.sleep(self.delay)
+                self.produced += 1
+                yield Chunk()
+        finally:
+            self.finished.set()
+
+
+@pytest.fixture
+def half_open_breaker(monkeypatch):
+    breaker = llm_gateway.CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    monkeypatch.setattr(llm_gateway, "_breaker", breaker)
+    return breaker
+
+
+def test_abandoned_stream_frees_the_half_open_trial(half_open_breaker, monkeypatch):
+    backend = SlowStream()
+    monkeypatch.setattr(llm_gateway, "_backend", backend)
+    stream = llm_gateway.generate_stream(["prompt"])
+    next(stream)
+    stream.close()
+
+    # The upstream read stops instead of queueing chunks nobody reads
+    assert backend.finished.wait(2)
+    assert backend.produced < backend.n
+
+    # The next call is let through as the trial, and its success closes the breaker
+    backend.n = 3
+    assert "".join(llm_gateway.generate_stream(["prompt"])) == "xxx"
+    assert half_open_breaker.state == "closed"
+
+
+def test_stream_consumer_error_frees_the_half_open_trial(half_open_breaker, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_backend", SlowStream())
+
+    def consume():
+        for _ in llm_gateway.generate_stream(["prompt"]):
+            raise ValueError("bad chunk")
+
+    with pytest.raises(ValueError):
+        consume()
+    assert half_open_breaker.allow()
@@ -0,0 +1,21 @@
+from app import llm_gateway, routes
+from app.fake_llm import FakeBackend
+
+
+def test_diagnostic_routes_need_the_token(client, monkeypatch):
+    for route in ("/db_stats", "/llm_stats", "/stock", "/metrics"):
+        assert client.get(route).status_code == 403
+    monkeypatch.setattr(routes, "DIAGNOSTICS_TOKEN", "s3cret")
+    assert client.get("/db_stats", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get("/db_stats", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200 and isinstance(response.get_json(), list)
+
+
+def test_streamed_calls_count_their_tokens(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_backend", FakeBackend())
+    before = dict(llm_gateway.LLM_TOKENS._values)
+    text = "".join(llm_gateway.generate_stream(["generate questions about the category 'work' at the 'easy' level"],
+                                               config={"response_schema": object}))
+    after = llm_gateway.LLM_TOKENS._values
+    assert after[("prompt",)] > before.get(("prompt",), 0)
+    assert after[("output",)] - before.get(("output",), 0) >= len(text) // 4
@@ -0,0 +1,21 @@
+from werkzeug.security import generate_password_hash
+
+from app import passwords
+from app.config import LOGIN_FAILURE_WINDOW_S, LOGIN_MAX_FAILURES, PASSWORD_HASH_METHOD
+
+
+def test_throttled_login_retry_after_follows_the_failure_window(client):
+    form = {"username": "nobody-by-this-name", "password": "guess"}
+    for _ in range(LOGIN_MAX_FAILURES):
+        assert client.post("/login", data=form).status_code == 302
+    response = client.post("/login", data=form)
+    assert response.status_code == 429
+    assert LOGIN_FAILURE_WINDOW_S - 5 <= int(response.headers["Retry-After"]) <= LOGIN_FAILURE_WINDOW_S
+
+
+def test_login_check_runs_on_the_forkserver_pool():
+    stored = generate_password_hash("right", method="pbkdf2:sha256:1000")
+    assert passwords.check_login("pool-user", "wrong", stored) == (False, None)
+    ok, upgraded = passwords.check_login("pool-user", "right", stored)
+    assert ok and upgraded.startswith(PASSWORD_HASH_METHOD.split(":")[0])
+    assert passwords._get_pool()._mp_context.get_start_method() == "forkserver"
@@ -0,0 +1,63 @@
+import threading
+
+from app import llm_gateway, replenish
+from app.connection import fetchone
+from app.fake_llm import FakeBackend
+from conftest import make_question
+
+
+def test_waiter_is_resolved_by_a_running_batch_refill():
+    key = ("waiter batch", "easy")
+    previous = llm_gateway.set_backend(FakeBackend(latency=0.3))
+    try:
+        with replenish._lock:
+            replenish._inflight.add(key)
+        replenish._executor.submit(replenish._refill_batch, [(*key, 3)])
+        # The forced refill is dropped, since the bucket is already in flight
+        question_id = replenish.wait_for_question(*key, timeout=10)
+    finally:
+        llm_gateway.set_backend(previous)
+    assert question_id is not None
+    assert fetchone("SELECT category, difficulty_level FROM questions WHERE id = ?", (question_id,)) == key
+
+
+def test_waiter_is_resolved_by_the_seed():
+    key = ("waiter seed", "medium")
+    release = threading.Event()
+    seeded = []
+
+    def generate(text):
+        release.wait(10)
+        return seeded
+
+    seeded.append(make_question(*key))
+    original = replenish.generate_questions
+    replenish.generate_questions = generate
+    try:
+        with replenish._lock:
+            replenish._inflight.update([(None, None), key])
+        replenish._executor.submit(replenish._run_seed)
+        future = replenish.question_future(*key)
+        release.set()
+        question_id = future.result(timeout=10)
+    finally:
+        replenish.generate_questions = original
+        with replenish._lock:
+            replenish._inflight.discard(key)
+    assert fetchone("SELECT category, difficulty_level FROM questions WHERE id = ?", (question_id,)) == key
+
+
+def test_bucket_refill_gives_up_only_after_empty_batches_in_a_row(monkeypatch):
+    results = iter([0, 3, 0, 3, 0, 0, 3])
+    calls = []
+
+    def generate_into(key, text):
+        calls.append(key)
+        return next(results)
+
+    monkeypatch.setattr(replenish, "_generate_into", generate_into)
+    monkeypatch.setattr(replenish, "relevant_text", lambda path, query: "")
+    monkeypatch.setattr(replenish, "REPLENISH_HIGH_WATERMARK", 100)
+    replenish._refill_bucket("mixed batches", "hard", force=False)
+    # Each batch that added rows restarts the count of empty ones
+    assert len(calls) == 6
@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+from app.db import save_study_plan
+from conftest import ROOT
+
+
+def test_status_of_a_plan_generated_by_another_worker(client):
+    user_id, quiz_id = 9001, "quiz-run-elsewhere"
+    save_study_plan(user_id, "<ul><li>last quiz</li></ul>", "an-earlier-quiz")
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session["quiz_id"] = quiz_id
+
+    # This process never queued the job, so it must not report the earlier quiz's plan
+    assert client.get("/study_plan_status").get_json() == {"status": "pending", "plan": None}
+
+    subprocess.run([sys.executable, "-c", "from app.db import save_study_plan; "
+                    f"save_study_plan({user_id}, '<ul><li>this quiz</li></ul>', {quiz_id!r})"],
+                   cwd=ROOT, check=True)
+    assert client.get("/study_plan_status").get_json() == {"status": "done", "plan": "<ul><li>this quiz</li></ul>"}
@@ -0,0 +1,20 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py
+
+The app is built once in the gunicorn master (preload_app) with its caches
+warmed, so workers fork with everything loaded and answer their first
+request at full speed. Set SERVER_MODE=async to serve through app.asgi.
+"""
+from app import create_app, warm_up
+from app.config import SERVER_MODE
+from app.connection import close_conn
+
+flask_app = create_app(background=False)
+warm_up()
+# SQLite connections must not cross a fork; workers open their own
+close_conn()
+
+if SERVER_MODE == "async":
+    from app.asgi import create_asgi_app
+    app = create_asgi_app(flask_app)
+else:
+    app = flask_app